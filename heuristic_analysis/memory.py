@@ -0,0 +1,44 @@
+# Mede a memória usada pela procura de um tabuleiro lido do standard input.
+# Use with PYTHONPATH=. python heuristic_analysis/memory.py [procura] < tests/input_T05
+# Output: procura,bytes por nó,bytes por estado,estados criados,pico de memória em KiB
+
+import sys
+import tracemalloc
+from typing import Callable
+
+from search import InstrumentedProblem, Node
+from takuzu import SEARCHES, Board, TakuzuState, make_problem
+
+
+def allocation_size(make: Callable[[], object], count: int = 10000) -> int:
+    """Devolve a memória alocada, em média, por cada objeto criado por make."""
+
+    tracemalloc.start()
+    objects = [make() for _ in range(count)]
+    size = tracemalloc.get_traced_memory()[0] - sys.getsizeof(objects)
+    tracemalloc.stop()
+    return size // count
+
+
+def make_node(parent: Node) -> Node:
+    """Cria um nó com os valores guardados por best_first_graph_search e astar_search."""
+
+    node = Node(parent.state, parent, (0, 0, 0), 1)
+    node.f = node.h = 0
+    return node
+
+
+search = sys.argv[1] if len(sys.argv) > 1 else "dfs"
+board = Board.parse_instance(sys.stdin)
+problem = InstrumentedProblem(make_problem(board))
+
+root = Node(problem.initial)
+node_size = allocation_size(lambda: make_node(root))
+state_size = allocation_size(lambda: TakuzuState(board, problem.initial.ids))
+
+tracemalloc.start()
+SEARCHES[search](problem)
+(_, peak) = tracemalloc.get_traced_memory()
+tracemalloc.stop()
+
+print(f"{search},{node_size},{state_size},{problem.states},{peak // 1024}")
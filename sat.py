@@ -0,0 +1,374 @@
+"""
+Propositional satisfiability with conflict-driven clause learning
+
+Formulas are given in conjunctive normal form, as in the DIMACS format:
+variables are the integers 1..num_vars, a literal is a variable (true) or
+its negation (false), and a clause is a list of literals. A model is the
+list of literals, one per variable, that are true in it.
+
+Formulas can also be written as DIMACS files and handed to an external
+solver installed on the machine (see external_satisfiable).
+"""
+
+import heapq
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+
+
+class CDCLSolver:
+    """A CDCL solver: unit propagation with two watched literals per clause,
+    first-UIP clause learning with non-chronological backjumping, VSIDS
+    variable activities with phase saving, and restarts following the Luby
+    sequence. Learned clauses are kept for the whole search, so the solver
+    never explores the same failure twice.
+
+    solve() returns a model, or None if the formula is unsatisfiable. If a
+    deadline (a time.monotonic() value) is given, it raises TimeoutError once
+    the deadline has passed. The counters decisions, propagations, conflicts,
+    restarts and learned record the work done."""
+
+    restart_base = 100
+    activity_decay = 0.95
+
+    def __init__(self, num_vars, clauses):
+        self.num_vars = num_vars
+        # values[lit] is 1 if lit is true, -1 if it is false and 0 if it is
+        # unassigned; negative literals index the list from the end
+        self.values = [0] * (2 * num_vars + 1)
+        self.level = [0] * (num_vars + 1)
+        self.reason = [None] * (num_vars + 1)
+        self.phase = [-1] * (num_vars + 1)
+        self.activity = [0.0] * (num_vars + 1)
+        self.increment = 1.0
+        self.order = [(0.0, var) for var in range(1, num_vars + 1)]  # Max-heap of (-activity, var)
+        self.clauses = []
+        self.watches = {lit: [] for var in range(1, num_vars + 1) for lit in (var, -var)}
+        self.trail = []
+        self.trail_lim = []
+        self.qhead = 0
+        self.units = []
+        self.unsat = False
+        self.decisions = self.propagations = self.conflicts = self.restarts = self.learned = 0
+        for clause in clauses:
+            self.add_clause(clause)
+
+    def add_clause(self, clause):
+        """Add a clause of the formula, before solving."""
+        lits = set(clause)
+        if any(-lit in lits for lit in lits):
+            return  # Tautology
+        lits = list(lits)
+        if not lits:
+            self.unsat = True
+        elif len(lits) == 1:
+            self.units.append(lits[0])
+        else:
+            self.attach(lits)
+
+    def attach(self, lits):
+        """Store a clause of two or more literals, watching the first two."""
+        index = len(self.clauses)
+        self.clauses.append(lits)
+        self.watches[lits[0]].append(index)
+        self.watches[lits[1]].append(index)
+        return index
+
+    def decision_level(self):
+        return len(self.trail_lim)
+
+    def enqueue(self, lit, reason):
+        """Make lit true, implied by the clause with index reason (None for decisions)."""
+        var = abs(lit)
+        self.values[lit] = 1
+        self.values[-lit] = -1
+        self.level[var] = len(self.trail_lim)
+        self.reason[var] = reason
+        self.trail.append(lit)
+
+    def propagate(self):
+        """Unit propagation. Returns the index of a conflicting clause, or None."""
+        values, clauses, watches = self.values, self.clauses, self.watches
+        while self.qhead < len(self.trail):
+            false_lit = -self.trail[self.qhead]
+            self.qhead += 1
+            self.propagations += 1
+            watching = watches[false_lit]
+            kept = 0
+            i = 0
+            while i < len(watching):
+                index = watching[i]
+                i += 1
+                clause = clauses[index]
+                # Keep the falsified watch in the second position
+                if clause[0] == false_lit:
+                    clause[0], clause[1] = clause[1], false_lit
+                first = clause[0]
+                if values[first] == 1:
+                    watching[kept] = index
+                    kept += 1
+                    continue
+                for k in range(2, len(clause)):
+                    lit = clause[k]
+                    if values[lit] != -1:
+                        clause[1], clause[k] = lit, false_lit
+                        watches[lit].append(index)
+                        break
+                else:
+                    watching[kept] = index
+                    kept += 1
+                    if values[first] == -1:
+                        while i < len(watching):
+                            watching[kept] = watching[i]
+                            kept += 1
+                            i += 1
+                        del watching[kept:]
+                        return index
+                    self.enqueue(first, index)
+            del watching[kept:]
+        return None
+
+    def analyze(self, conflict):
+        """First-UIP conflict analysis. Returns the learned clause, with the
+        asserting literal first and a literal of the backjump level second,
+        and the level to backjump to."""
+        seen = set()
+        learnt = [None]
+        pending = 0
+        lit = None
+        index = len(self.trail) - 1
+        clause = self.clauses[conflict]
+        current = self.decision_level()
+        while True:
+            for q in clause:
+                var = abs(q)
+                if q != lit and var not in seen and self.level[var] > 0:
+                    seen.add(var)
+                    self.bump(var)
+                    if self.level[var] == current:
+                        pending += 1
+                    else:
+                        learnt.append(q)
+            while abs(self.trail[index]) not in seen:
+                index -= 1
+            lit = self.trail[index]
+            index -= 1
+            pending -= 1
+            if pending == 0:
+                break
+            clause = self.clauses[self.reason[abs(lit)]]
+        learnt[0] = -lit
+
+        if len(learnt) == 1:
+            return learnt, 0
+        best = max(range(1, len(learnt)), key=lambda i: self.level[abs(learnt[i])])
+        learnt[1], learnt[best] = learnt[best], learnt[1]
+        return learnt, self.level[abs(learnt[1])]
+
+    def bump(self, var):
+        self.activity[var] += self.increment
+        if self.activity[var] > 1e100:
+            self.activity = [activity * 1e-100 for activity in self.activity]
+            self.increment *= 1e-100
+            self.order = [(-self.activity[var], var) for (_, var) in self.order]
+            heapq.heapify(self.order)
+        heapq.heappush(self.order, (-self.activity[var], var))
+
+    def backjump(self, level):
+        """Undo every assignment above the given decision level."""
+        if self.decision_level() <= level:
+            return
+        start = self.trail_lim[level]
+        for lit in self.trail[start:]:
+            var = abs(lit)
+            self.values[lit] = self.values[-lit] = 0
+            self.reason[var] = None
+            self.phase[var] = 1 if lit > 0 else -1
+            heapq.heappush(self.order, (-self.activity[var], var))
+        del self.trail[start:]
+        del self.trail_lim[level:]
+        self.qhead = start
+
+    def pick_branch_literal(self):
+        """The unassigned variable with the highest activity, with its saved
+        phase, or None if every variable is assigned."""
+        while self.order:
+            (_, var) = heapq.heappop(self.order)
+            if self.values[var] == 0:
+                return var * self.phase[var]
+        return None
+
+    def solve(self, deadline=None):
+        if self.unsat:
+            return None
+        for lit in self.units:
+            if self.values[lit] == -1:
+                return None
+            if self.values[lit] == 0:
+                self.enqueue(lit, None)
+
+        restart_limit = self.restart_base * luby(1)
+        conflicts_since_restart = 0
+        while True:
+            conflict = self.propagate()
+            if conflict is not None:
+                self.conflicts += 1
+                conflicts_since_restart += 1
+                if self.decision_level() == 0:
+                    return None
+                learnt, level = self.analyze(conflict)
+                self.backjump(level)
+                self.enqueue(learnt[0], self.attach(learnt) if len(learnt) > 1 else None)
+                self.learned += 1
+                self.increment /= self.activity_decay
+                continue
+
+            if conflicts_since_restart >= restart_limit:
+                if deadline is not None and time.monotonic() > deadline:
+                    raise TimeoutError('search deadline exceeded')
+                self.restarts += 1
+                restart_limit = self.restart_base * luby(self.restarts + 1)
+                conflicts_since_restart = 0
+                self.backjump(0)
+                # Drop the stale entries that bump and backjump leave in the heap
+                self.order = [(-self.activity[var], var) for var in range(1, self.num_vars + 1) if self.values[var] == 0]
+                heapq.heapify(self.order)
+                continue
+
+            lit = self.pick_branch_literal()
+            if lit is None:
+                return [var if self.values[var] == 1 else -var for var in range(1, self.num_vars + 1)]
+            if deadline is not None and self.decisions % 1000 == 0 and time.monotonic() > deadline:
+                raise TimeoutError('search deadline exceeded')
+            self.decisions += 1
+            self.trail_lim.append(len(self.trail))
+            self.enqueue(lit, None)
+
+
+def luby(i):
+    """The i-th element (from 1) of the Luby sequence 1, 1, 2, 1, 1, 2, 4, ..."""
+    k = 1
+    while (1 << k) - 1 < i:
+        k += 1
+    while (1 << k) - 1 != i:
+        i -= (1 << (k - 1)) - 1
+        k = 1
+        while (1 << k) - 1 < i:
+            k += 1
+    return 1 << (k - 1)
+
+
+def cdcl_satisfiable(num_vars, clauses, deadline=None):
+    """Return a model of the CNF formula, or None if it is unsatisfiable.
+    >>> cdcl_satisfiable(2, [[1, 2], [-1], [-2, 1, 2]])
+    [-1, 2]
+    >>> cdcl_satisfiable(1, [[1], [-1]])
+    """
+    return CDCLSolver(num_vars, clauses).solve(deadline)
+
+
+def sequential_at_most(lits, k, next_var):
+    """Clauses stating that at most k of the literals are true (sequential
+    counter encoding), using auxiliary variables from next_var on.
+    Returns the clauses and the next unused variable."""
+    n = len(lits)
+    if k >= n:
+        return [], next_var
+    if k == 0:
+        return [[-lit] for lit in lits], next_var
+
+    def s(i, j):  # At least j + 1 of the first i + 1 literals are true
+        return next_var + i * k + j
+
+    clauses = [[-lits[0], s(0, 0)]]
+    clauses += [[-s(0, j)] for j in range(1, k)]
+    for i in range(1, n - 1):
+        clauses.append([-lits[i], s(i, 0)])
+        clauses.append([-s(i - 1, 0), s(i, 0)])
+        for j in range(1, k):
+            clauses.append([-lits[i], -s(i - 1, j - 1), s(i, j)])
+            clauses.append([-s(i - 1, j), s(i, j)])
+        clauses.append([-lits[i], -s(i - 1, k - 1)])
+    clauses.append([-lits[n - 1], -s(n - 2, k - 1)])
+    return clauses, next_var + (n - 1) * k
+
+
+# ______________________________________________________________________________
+# DIMACS files and external solvers
+
+
+# Solvers looked for in the PATH by find_external_solver, in order of preference
+EXTERNAL_SOLVERS = ('kissat', 'cadical', 'cryptominisat5', 'glucose', 'minisat')
+
+
+def write_dimacs(stream, num_vars, clauses):
+    """Write the CNF formula to the stream, in DIMACS format."""
+    stream.write('p cnf {} {}\n'.format(num_vars, len(clauses)))
+    for clause in clauses:
+        stream.write(' '.join(map(str, clause)) + ' 0\n')
+
+
+def read_dimacs_model(lines, num_vars):
+    """Read the answer of a solver, either in the SAT competition format
+    ('s SATISFIABLE' and 'v' lines) or as a MiniSat result file ('SAT' and
+    a line of literals). Returns the model, with the variables the solver
+    left out as false, or None if the formula is unsatisfiable.
+    >>> read_dimacs_model(['c comment', 's SATISFIABLE', 'v 1 -2', 'v 0'], 3)
+    [1, -2, -3]
+    >>> read_dimacs_model(['UNSAT'], 3)
+    """
+    status = None
+    true_vars = set()
+    for line in lines:
+        tokens = line.split()
+        if not tokens or tokens[0] == 'c':
+            continue
+        if tokens[0] == 's':
+            status = tokens[1]
+        elif tokens[0] in ('SAT', 'UNSAT', 'INDET'):
+            status = tokens[0]
+        else:
+            true_vars.update(int(token) for token in tokens if token.isdigit() and int(token) > 0)
+
+    if status in ('UNSATISFIABLE', 'UNSAT'):
+        return None
+    if status not in ('SATISFIABLE', 'SAT'):
+        raise ValueError('the solver did not find an answer')
+    return [var if var in true_vars else -var for var in range(1, num_vars + 1)]
+
+
+def find_external_solver(names=EXTERNAL_SOLVERS):
+    """The path of the first of the named solvers found in the PATH, or None."""
+    for name in names:
+        path = shutil.which(name)
+        if path is not None:
+            return path
+    return None
+
+
+def external_satisfiable(num_vars, clauses, solver, deadline=None):
+    """Like cdcl_satisfiable, but writes the formula to a DIMACS file and
+    runs the given solver executable on it. MiniSat and Glucose write the
+    model to a result file; the other solvers to the standard output."""
+    with tempfile.TemporaryDirectory() as directory:
+        formula = os.path.join(directory, 'formula.cnf')
+        result = os.path.join(directory, 'result')
+        with open(formula, 'w') as stream:
+            write_dimacs(stream, num_vars, clauses)
+
+        args = [solver, formula]
+        if os.path.basename(solver).startswith(('minisat', 'glucose')):
+            args.append(result)
+        timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+        try:
+            output = subprocess.run(args, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True,
+                                    timeout=timeout).stdout
+        except subprocess.TimeoutExpired:
+            raise TimeoutError('search deadline exceeded')
+
+        if os.path.exists(result):
+            with open(result) as stream:
+                return read_dimacs_model(stream, num_vars)
+        return read_dimacs_model(output.splitlines(), num_vars)
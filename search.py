@@ -7,6 +7,7 @@ functions.
 """
 
 import sys
+import time
 from collections import deque
 
 from utils import *
@@ -73,7 +74,12 @@ class Node:
     the total path_cost (also known as g) to reach the node. Other functions
     may add an f and h value; see best_first_graph_search and astar_search for
     an explanation of how the f and h values are handled. You will not need to
-    subclass this class."""
+    subclass this class.
+
+    Nodes have no __dict__: every attribute, including the f and h values
+    cached by memoize, has its own slot, which keeps large frontiers small."""
+
+    __slots__ = ('state', 'parent', 'action', 'path_cost', 'depth', 'f', 'h')
 
     def __init__(self, state, parent=None, action=None, path_cost=0):
         """Create a search tree Node, derived from a parent by an action."""
@@ -175,13 +181,16 @@ class SimpleProblemSolvingAgentProgram:
 # Uninformed Search algorithms
 
 
-def breadth_first_tree_search(problem):
+def breadth_first_tree_search(problem, keep_path=True):
     """
     [Figure 3.7]
     Search the shallowest nodes in the search tree first.
     Search through the successors of a problem to find a goal.
     The argument frontier should be an empty queue.
     Repeats infinitely in case of loops.
+    If keep_path is False, nodes do not keep their parent, so expanded
+    nodes can be freed as soon as they leave the frontier; the goal node
+    then has no path (but still has its state, action and depth).
     """
 
     frontier = deque([Node(problem.initial)])  # FIFO queue
@@ -190,17 +199,20 @@ def breadth_first_tree_search(problem):
         node = frontier.popleft()
         if problem.goal_test(node.state):
             return node
-        frontier.extend(node.expand(problem))
+        frontier.extend(expand_children(node, problem, keep_path))
     return None
 
 
-def depth_first_tree_search(problem):
+def depth_first_tree_search(problem, keep_path=True):
     """
     [Figure 3.7]
     Search the deepest nodes in the search tree first.
     Search through the successors of a problem to find a goal.
     The argument frontier should be an empty queue.
     Repeats infinitely in case of loops.
+    If keep_path is False, nodes do not keep their parent, so memory is
+    bounded by the frontier instead of by every ancestor still in use
+    (see breadth_first_tree_search).
     """
 
     frontier = [Node(problem.initial)]  # Stack
@@ -209,10 +221,19 @@ def depth_first_tree_search(problem):
         node = frontier.pop()
         if problem.goal_test(node.state):
             return node
-        frontier.extend(node.expand(problem))
+        frontier.extend(expand_children(node, problem, keep_path))
     return None
 
 
+def expand_children(node, problem, keep_path=True):
+    """Expand node; if keep_path is False, drop the children's parent links."""
+    children = node.expand(problem)
+    if not keep_path:
+        for child in children:
+            child.parent = None
+    return children
+
+
 def depth_first_graph_search(problem):
     """
     [Figure 3.7]
@@ -221,17 +242,23 @@ def depth_first_graph_search(problem):
     The argument frontier should be an empty queue.
     Does not get trapped by loops.
     If two paths reach a state, only use the first one.
+    The states in the frontier are mirrored in a set, so that checking
+    whether a child is already in the frontier is O(1).
     """
     frontier = [(Node(problem.initial))]  # Stack
+    frontier_states = {problem.initial}
 
     explored = set()
     while frontier:
         node = frontier.pop()
+        frontier_states.discard(node.state)
         if problem.goal_test(node.state):
             return node
         explored.add(node.state)
-        frontier.extend(child for child in node.expand(problem)
-                        if child.state not in explored and child not in frontier)
+        for child in node.expand(problem):
+            if child.state not in explored and child.state not in frontier_states:
+                frontier.append(child)
+                frontier_states.add(child.state)
     return None
 
 
@@ -240,20 +267,25 @@ def breadth_first_graph_search(problem):
     Note that this function can be implemented in a
     single line as below:
     return graph_search(problem, FIFOQueue())
+    The states in the frontier are mirrored in a set, so that checking
+    whether a child is already in the frontier is O(1).
     """
     node = Node(problem.initial)
     if problem.goal_test(node.state):
         return node
     frontier = deque([node])
+    frontier_states = {node.state}
     explored = set()
     while frontier:
         node = frontier.popleft()
+        frontier_states.discard(node.state)
         explored.add(node.state)
         for child in node.expand(problem):
-            if child.state not in explored and child not in frontier:
+            if child.state not in explored and child.state not in frontier_states:
                 if problem.goal_test(child.state):
                     return child
                 frontier.append(child)
+                frontier_states.add(child.state)
     return None
 
 
@@ -293,25 +325,26 @@ def uniform_cost_search(problem, display=False):
 
 
 def depth_limited_search(problem, limit=50):
-    """[Figure 3.17]"""
-
-    def recursive_dls(node, problem, limit):
-        if problem.goal_test(node.state):
+    """[Figure 3.17]
+    Explores the same nodes in the same order as the recursive version in
+    the figure, but keeps an explicit stack with the children still to be
+    visited at each depth, so the limit is not bounded by Python's
+    recursion limit. A cutoff anywhere in the tree makes the result
+    'cutoff', as it propagates up through every recursive call."""
+
+    stack = [iter([Node(problem.initial)])]
+    cutoff_occurred = False
+    while stack:
+        node = next(stack[-1], None)
+        if node is None:
+            stack.pop()
+        elif problem.goal_test(node.state):
             return node
-        elif limit == 0:
-            return 'cutoff'
+        elif len(stack) > limit:  # the node is at depth limit
+            cutoff_occurred = True
         else:
-            cutoff_occurred = False
-            for child in node.expand(problem):
-                result = recursive_dls(child, problem, limit - 1)
-                if result == 'cutoff':
-                    cutoff_occurred = True
-                elif result is not None:
-                    return result
-            return 'cutoff' if cutoff_occurred else None
-
-    # Body of depth_limited_search:
-    return recursive_dls(Node(problem.initial), problem, limit)
+            stack.append(iter(node.expand(problem)))
+    return 'cutoff' if cutoff_occurred else None
 
 
 def iterative_deepening_search(problem):
@@ -604,35 +637,56 @@ class PlanRoute(Problem):
 
 
 def recursive_best_first_search(problem, h=None):
-    """[Figure 3.26]"""
+    """[Figure 3.26]
+    The recursive calls of RBFS are kept in an explicit stack of frames
+    instead of Python's call stack, so deep searches do not hit the
+    recursion limit. Nodes are expanded and f values updated exactly as in
+    the recursive version."""
     h = memoize(h or problem.h, 'h')
 
-    def RBFS(problem, node, flimit):
+    node = Node(problem.initial)
+    node.f = h(node)
+    flimit = np.inf
+    # Calls in progress, as (flimit, successors); the call on the first
+    # successor is the one running
+    stack = []
+    while True:
+        # Call RBFS(problem, node, flimit)
         if problem.goal_test(node.state):
-            return node, 0  # (The second value is immaterial)
-        successors = node.expand(problem)
-        if len(successors) == 0:
-            return None, np.inf
-        for s in successors:
-            s.f = max(s.path_cost + h(s), node.f)
-        while True:
+            result, returned_f = node, 0  # (The second value is immaterial)
+        else:
+            successors = node.expand(problem)
+            if len(successors) == 0:
+                result, returned_f = None, np.inf
+            else:
+                for s in successors:
+                    s.f = max(s.path_cost + h(s), node.f)
+                stack.append((flimit, successors))
+                result, returned_f = None, None
+
+        # Resume the calls in progress, until one of them calls RBFS again
+        while stack:
+            flimit, successors = stack[-1]
+            if returned_f is not None:
+                successors[0].f = returned_f
+                if result is not None:
+                    stack.pop()
+                    continue
             # Order by lowest f value
             successors.sort(key=lambda x: x.f)
             best = successors[0]
             if best.f > flimit:
-                return None, best.f
+                stack.pop()
+                result, returned_f = None, best.f
+                continue
             if len(successors) > 1:
                 alternative = successors[1].f
             else:
                 alternative = np.inf
-            result, best.f = RBFS(problem, best, min(flimit, alternative))
-            if result is not None:
-                return result, best.f
-
-    node = Node(problem.initial)
-    node.f = h(node)
-    result, bestf = RBFS(problem, node, np.inf)
-    return result
+            node, flimit = best, min(flimit, alternative)
+            break
+        else:
+            return result
 
 
 def hill_climbing(problem):
@@ -1554,6 +1608,110 @@ class InstrumentedProblem(Problem):
                                                self.states, str(self.found)[:4])
 
 
+class ProfiledProblem(InstrumentedProblem):
+    """Delegates to a problem, and keeps the statistics of InstrumentedProblem
+    together with a profile of the search: the time spent in actions,
+    result (or apply, for searches that change states in place), goal_test
+    and h; the number of backtracks (dead ends, states with no actions); the
+    deepest state goal-tested, for states with a depth attribute; and the
+    peak number of nodes generated but not yet goal-tested. That is the
+    frontier size for tree searches, and an upper bound on it for graph
+    searches, which do not add every generated node to the frontier.
+    Searches that start over from the initial state, such as
+    iterative_deepening_search, discard their frontier each time, so
+    goal-testing the initial state resets the count to that state alone.
+    Searches that change states in place keep a stack of pending actions
+    instead of generated nodes, so their peak frontier is left out; the
+    stack is as deep as the deepest state, max_depth."""
+
+    def __init__(self, problem):
+        super().__init__(problem)
+        self.times = {'actions': 0.0, 'result': 0.0, 'goal_test': 0.0, 'h': 0.0}
+        self.backtracks = self.max_depth = 0
+        self.frontier = self.peak_frontier = 1
+        self.in_place = False
+
+    def actions(self, state):
+        start = time.perf_counter()
+        actions = super().actions(state)
+        self.times['actions'] += time.perf_counter() - start
+        if not actions:
+            self.backtracks += 1
+        return actions
+
+    def result(self, state, action):
+        start = time.perf_counter()
+        result = super().result(state, action)
+        self.times['result'] += time.perf_counter() - start
+        self.frontier += 1
+        self.peak_frontier = max(self.peak_frontier, self.frontier)
+        return result
+
+    def apply(self, state, action):
+        start = time.perf_counter()
+        self.states += 1
+        self.problem.apply(state, action)
+        self.times['result'] += time.perf_counter() - start
+        self.in_place = True
+
+    def goal_test(self, state):
+        start = time.perf_counter()
+        result = super().goal_test(state)
+        self.times['goal_test'] += time.perf_counter() - start
+        if state is self.initial:
+            self.frontier = 1
+        self.frontier -= 1
+        self.max_depth = max(self.max_depth, getattr(state, 'depth', 0))
+        return result
+
+    def h(self, node):
+        start = time.perf_counter()
+        result = self.problem.h(node)
+        self.times['h'] += time.perf_counter() - start
+        return result
+
+    def profile(self, elapsed):
+        """Return the statistics as a dict, for a search that took elapsed seconds."""
+        profile = {'nodes': {'succs': self.succs, 'goal_tests': self.goal_tests, 'states': self.states},
+                   'nodes_per_second': self.goal_tests / elapsed if elapsed > 0 else None,
+                   'times': dict(self.times),
+                   'backtracks': self.backtracks,
+                   'max_depth': self.max_depth}
+        if not self.in_place:
+            profile['peak_frontier'] = self.peak_frontier
+        return profile
+
+
+class DeadlineProblem(Problem):
+    """Delegates to a problem, and raises TimeoutError once the deadline
+    (a time.monotonic() value) has passed. The deadline is checked every
+    time the search asks for the actions of a state."""
+
+    def __init__(self, problem, deadline):
+        self.problem = problem
+        self.deadline = deadline
+
+    def actions(self, state):
+        if time.monotonic() > self.deadline:
+            raise TimeoutError('search deadline exceeded')
+        return self.problem.actions(state)
+
+    def result(self, state, action):
+        return self.problem.result(state, action)
+
+    def goal_test(self, state):
+        return self.problem.goal_test(state)
+
+    def path_cost(self, c, state1, action, state2):
+        return self.problem.path_cost(c, state1, action, state2)
+
+    def value(self, state):
+        return self.problem.value(state)
+
+    def __getattr__(self, attr):
+        return getattr(self.problem, attr)
+
+
 def compare_searchers(problems, header,
                       searchers=[breadth_first_tree_search,
                                  breadth_first_graph_search,
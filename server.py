@@ -0,0 +1,341 @@
+# server.py: Serviço local de resolução de tabuleiros de Takuzu, que recebe
+# tabuleiros por TCP ou por um socket Unix e os resolve num conjunto de
+# processos, com as técnicas de procura de takuzu.py.
+
+# Grupo 40:
+# 99311 Rafael Serra e Oliveira
+# 99335 Tiago Vieira da Silva
+
+import asyncio
+import json
+import math
+import os
+import time
+from argparse import ArgumentParser
+from concurrent.futures import Future, ProcessPoolExecutor
+from multiprocessing import get_context
+from multiprocessing.synchronize import Event as EventType
+from io import StringIO
+from typing import Dict, List, Optional, Set, Tuple
+
+from search import DeadlineProblem, InstrumentedProblem
+from takuzu import BACKENDS, FORMULATIONS, ORDERINGS, SEARCHES, make_problem
+
+
+class Request:
+    """Um tabuleiro submetido por um cliente, à espera de ser resolvido."""
+
+    def __init__(self, id: int, text: str, deadline: Optional[float], response: "asyncio.Future[Dict[str, object]]"):
+        """Recebe o número de ordem do pedido na ligação, o texto do tabuleiro,
+        o prazo (um valor de time.monotonic(), ou None) e o futuro onde será
+        posta a resposta."""
+
+        self.id = id
+        self.text = text
+        self.deadline = deadline
+        self.response = response
+        self.cancelled = False
+        # Índice do sinal de paragem (ver TakuzuServer.stops) enquanto o pedido estiver a ser resolvido
+        self.slot: Optional[int] = None
+
+
+class RequestCancelled(Exception):
+    """O pedido foi cancelado enquanto estava a ser resolvido."""
+
+
+class CancellableProblem(DeadlineProblem):
+    """DeadlineProblem que também lança RequestCancelled assim que o sinal
+    stop for ativado. O sinal é verificado sempre que a procura pede as
+    ações de um estado."""
+
+    def __init__(self, problem, deadline: float, stop: EventType):
+        super().__init__(problem, deadline)
+        self.stop = stop
+
+    def actions(self, state):
+        if self.stop.is_set():
+            raise RequestCancelled()
+        return super().actions(state)
+
+
+# Sinais de paragem partilhados pelos processos do serviço, um por tarefa de distribuição (ver TakuzuServer.dispatch)
+request_stops: List[EventType] = []
+
+
+def init_worker(stops: List[EventType]) -> None:
+    """Inicializa um processo do serviço."""
+
+    global request_stops
+    request_stops = stops
+
+
+def solve_request(task: Tuple[str, str, str, str, str, Optional[float], int]) -> Dict[str, object]:
+    """Resolve o tabuleiro, no formato de entrada de takuzu.py, com a
+    representação, a técnica de procura, a política de ordenação e a
+    formulação indicadas, em no máximo remaining segundos, ou até ser ativado
+    o sinal de paragem slot. Devolve a resposta ao pedido, com o estado, a
+    solução e as contagens de InstrumentedProblem. Corre nos processos do
+    serviço."""
+
+    (text, backend, search, ordering, formulation, remaining, slot) = task
+    start = time.perf_counter()
+    try:
+        board = BACKENDS[backend].parse_instance(StringIO(text))
+    except ValueError as error:
+        return {"status": "error", "error": f"tabuleiro inválido: {error}"}
+    if board is None:
+        return {"status": "error", "error": "tabuleiro vazio"}
+
+    problem = InstrumentedProblem(make_problem(board, formulation, ordering))
+    deadline = time.monotonic() + remaining if remaining is not None else math.inf
+    try:
+        goal_node = SEARCHES[search](CancellableProblem(problem, deadline, request_stops[slot]))
+    except TimeoutError:
+        (status, solution) = ("timed_out", None)
+    except RequestCancelled:
+        (status, solution) = ("cancelled", None)
+    else:
+        (status, solution) = ("solved", str(goal_node.state)) if goal_node else ("no_solution", None)
+
+    return {
+        "status": status,
+        "solution": solution,
+        "nodes": {"succs": problem.succs, "goal_tests": problem.goal_tests, "states": problem.states},
+        "time": time.perf_counter() - start,
+    }
+
+
+class TakuzuServer:
+    """Serviço assíncrono de resolução de tabuleiros.
+
+    Cada cliente envia tabuleiros seguidos, no formato de entrada de
+    takuzu.py, e recebe, pela mesma ordem, uma linha JSON por tabuleiro, com
+    o seu número de ordem na ligação (id), o estado (solved, no_solution,
+    timed_out ou error), a solução, no formato de saída de takuzu.py, e as
+    contagens de nós da procura.
+
+    Os pedidos esperam numa fila limitada a max_queue pedidos, da qual são
+    distribuídos por jobs processos. Enquanto a fila estiver cheia, o
+    serviço deixa de ler dos clientes, que ficam à espera por controlo de
+    fluxo. Cada pedido tem um prazo de timeout segundos desde que
+    chega: se expirar na fila, o pedido já não é resolvido, e se expirar
+    enquanto é resolvido, a procura é interrompida. Se a ligação a um
+    cliente falhar, os seus pedidos são cancelados: os que ainda estejam na
+    fila já não são resolvidos, e os que já estejam a ser resolvidos são
+    interrompidos através do sinal de paragem da tarefa que os distribuiu.
+    Um cliente que fecha a ligação depois de enviar os pedidos não se
+    distingue de um que só deixou de enviar e espera pelas respostas, pelo
+    que esses pedidos só terminam no prazo."""
+
+    def __init__(
+        self,
+        search: str = "dfs",
+        ordering: str = "row-major",
+        formulation: str = "cells",
+        backend: str = "bitmask",
+        timeout: Optional[float] = 60.0,
+        jobs: int = 0,
+        max_queue: int = 64,
+    ):
+        """O construtor recebe os parâmetros de resolução (ver takuzu.solve),
+        o prazo de cada pedido (None para não haver prazo), o número de
+        processos (0 para um por processador) e o tamanho da fila."""
+
+        self.task_options = (backend, search, ordering, formulation)
+        self.timeout = timeout
+        self.jobs = jobs
+        self.max_queue = max_queue
+        # Criada em start, para que pertença ao ciclo de eventos em que o serviço corre
+        self.queue: Optional["asyncio.Queue[Request]"] = None
+        self.executor: Optional[ProcessPoolExecutor] = None
+        self.stops: List[EventType] = []
+        self.running: Set[Future] = set()
+        self.dispatchers: List["asyncio.Task[None]"] = []
+
+    async def start(self) -> None:
+        """Cria a fila, o conjunto de processos e as tarefas que lhe distribuem os pedidos."""
+
+        workers = self.jobs or os.cpu_count() or 1
+        # Os processos não são criados com fork, porque o serviço já tem outras threads
+        context = get_context("spawn")
+        self.queue = asyncio.Queue(self.max_queue)
+        self.stops = [context.Event() for _ in range(workers)]
+        self.executor = ProcessPoolExecutor(workers, mp_context=context, initializer=init_worker, initargs=(self.stops,))
+        self.dispatchers = [asyncio.create_task(self.dispatch(slot)) for slot in range(workers)]
+
+    async def close(self) -> None:
+        """Cancela os pedidos por resolver, interrompe os que estão a ser
+        resolvidos e termina os processos."""
+
+        for dispatcher in self.dispatchers:
+            dispatcher.cancel()
+        await asyncio.gather(*self.dispatchers, return_exceptions=True)
+        if self.queue is not None:
+            while not self.queue.empty():
+                self.queue.get_nowait().response.cancel()
+        for stop in self.stops:
+            stop.set()
+        for future in self.running:
+            future.cancel()
+        if self.executor is not None:
+            # Os pedidos em curso param na próxima verificação do sinal, pelo que a espera é curta
+            await asyncio.get_running_loop().run_in_executor(None, self.executor.shutdown)
+
+    def cancel(self, request: Request) -> None:
+        """Cancela o pedido indicado: se ainda estiver na fila, já não é
+        resolvido; se estiver a ser resolvido, a procura é interrompida."""
+
+        request.cancelled = True
+        if request.slot is not None:
+            self.stops[request.slot].set()
+        request.response.cancel()
+
+    async def dispatch(self, slot: int) -> None:
+        """Retira pedidos da fila e resolve-os, um de cada vez, num dos
+        processos. Os pedidos são interrompidos através do sinal de paragem
+        slot, que só é usado por esta tarefa."""
+
+        while True:
+            request = await self.queue.get()  # type: ignore
+            try:
+                if request.cancelled or request.response.done():
+                    continue
+                remaining = None if request.deadline is None else request.deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    result: Dict[str, object] = {"status": "timed_out", "solution": None}
+                else:
+                    self.stops[slot].clear()
+                    request.slot = slot
+                    future = self.executor.submit(solve_request, (request.text, *self.task_options, remaining, slot))
+                    self.running.add(future)
+                    try:
+                        result = await asyncio.wrap_future(future)
+                    finally:
+                        self.running.discard(future)
+                        request.slot = None
+                if not request.response.done():
+                    request.response.set_result(result)
+            except Exception as error:  # o serviço continua a atender os restantes pedidos
+                if not request.response.done():
+                    request.response.set_result({"status": "error", "error": str(error)})
+            finally:
+                self.queue.task_done()  # type: ignore
+
+    async def read_request(self, reader: asyncio.StreamReader) -> Optional[str]:
+        """Lê o texto do próximo tabuleiro do cliente (a linha com o tamanho e
+        as linhas do tabuleiro), ou devolve None se o cliente não enviar mais
+        nenhum. Lança ValueError se o tabuleiro não estiver no formato de entrada."""
+
+        line = await reader.readline()
+        while line and not line.strip():
+            line = await reader.readline()
+        if not line:
+            return None
+
+        size = int(line)
+        if size <= 0:
+            raise ValueError(f"tamanho inválido: {size}")
+        rows = [await reader.readline() for _ in range(size)]
+        for row in rows:
+            entries = row.split(b"\t")
+            if len(entries) != size or any(entry.strip() not in (b"0", b"1", b"2") for entry in entries):
+                raise ValueError(f"linha inválida: {row.decode(errors='replace').strip()!r}")
+        return b"".join([line, *rows]).decode()
+
+    async def handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Atende um cliente: lê os seus pedidos, põe-nos na fila e escreve as
+        respostas pela ordem dos pedidos."""
+
+        loop = asyncio.get_running_loop()
+        requests: "asyncio.Queue[Optional[Request]]" = asyncio.Queue()
+        responder = asyncio.create_task(self.respond(requests, writer))
+        try:
+            request_id = 0
+            while not responder.done():
+                try:
+                    text = await self.read_request(reader)
+                except ValueError as error:
+                    response = loop.create_future()
+                    response.set_result({"status": "error", "error": f"tabuleiro inválido: {error}"})
+                    await requests.put(Request(request_id, "", None, response))
+                    break
+                if text is None:
+                    break
+
+                deadline = time.monotonic() + self.timeout if self.timeout is not None else None
+                request = Request(request_id, text, deadline, loop.create_future())
+                await requests.put(request)
+                await self.queue.put(request)  # type: ignore  # espera enquanto a fila estiver cheia
+                request_id += 1
+        except ConnectionError:
+            responder.cancel()  # o cliente desligou-se: cancela os seus pedidos
+        finally:
+            await requests.put(None)
+            await asyncio.gather(responder, return_exceptions=True)
+
+    async def respond(self, requests: "asyncio.Queue[Optional[Request]]", writer: asyncio.StreamWriter) -> None:
+        """Escreve as respostas aos pedidos de um cliente, pela ordem dos
+        pedidos. Se o cliente se desligar (ou a tarefa for cancelada), cancela
+        os pedidos que faltam, incluindo os que estão a ser resolvidos."""
+
+        request = None
+        try:
+            while (request := await requests.get()) is not None:
+                result = await request.response
+                writer.write(json.dumps({"id": request.id, **result}).encode() + b"\n")
+                await writer.drain()
+        except (ConnectionError, asyncio.CancelledError) as error:
+            if request is not None:
+                self.cancel(request)
+            while not requests.empty():
+                if (request := requests.get_nowait()) is not None:
+                    self.cancel(request)
+            if isinstance(error, asyncio.CancelledError):
+                raise
+        finally:
+            writer.close()
+
+
+async def serve(
+    server: TakuzuServer, host: str = "127.0.0.1", port: int = 8765, unix_path: Optional[str] = None
+) -> None:
+    """Atende clientes por TCP no endereço indicado, ou pelo socket Unix
+    unix_path, se for indicado, até o processo ser interrompido."""
+
+    await server.start()
+    try:
+        if unix_path is not None:
+            listener = await asyncio.start_unix_server(server.handle_client, unix_path)
+        else:
+            listener = await asyncio.start_server(server.handle_client, host, port)
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        await server.close()
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Serviço local de resolução de tabuleiros de Takuzu.")
+    parser.add_argument("--host", default="127.0.0.1", help="endereço TCP (por omissão, 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8765, help="porto TCP (por omissão, 8765)")
+    parser.add_argument("--unix", metavar="CAMINHO", help="atende por um socket Unix em vez de TCP")
+    parser.add_argument("--jobs", type=int, default=0, help="número de processos (por omissão, um por processador)")
+    parser.add_argument("--queue", type=int, default=64, help="número máximo de pedidos em fila (por omissão, 64)")
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=60.0,
+        help="prazo de cada pedido, em segundos, desde que chega (por omissão, 60; 0 para não haver prazo)",
+    )
+    parser.add_argument("--search", choices=SEARCHES, default="dfs", help="técnica de procura a usar")
+    parser.add_argument("--ordering", choices=ORDERINGS, default="row-major", help="política de ordenação")
+    parser.add_argument("--formulation", choices=FORMULATIONS, default="cells", help="formulação do problema")
+    parser.add_argument("--backend", choices=BACKENDS, default="bitmask", help="representação do tabuleiro")
+    args = parser.parse_args()
+
+    timeout = args.timeout or None
+    server = TakuzuServer(args.search, args.ordering, args.formulation, args.backend, timeout, args.jobs, args.queue)
+    try:
+        asyncio.run(serve(server, args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
@@ -2,15 +2,36 @@
 # 99311 Rafael Serra e Oliveira
 # 99335 Tiago Vieira da Silva
 
-from sys import stdin
-from typing import Dict, List, Optional, Set, Tuple
+import json
+import os
+import time
+from argparse import ArgumentParser
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from itertools import count, islice
+from multiprocessing import Event
+from multiprocessing.synchronize import Event as EventType
+from random import Random
+from sys import stderr, stdin
+from typing import Callable, Deque, Dict, Iterable, Iterator, List, Optional, TextIO, Tuple, Type, Union
+from sat import (
+    cdcl_satisfiable,
+    external_satisfiable,
+    find_external_solver,
+    read_dimacs_model,
+    sequential_at_most,
+    write_dimacs,
+)
 from search import (
     Problem,
     Node,
+    DeadlineProblem,
+    ProfiledProblem,
     astar_search,
     breadth_first_tree_search,
     depth_first_tree_search,
     greedy_search,
+    iterative_deepening_search,
     recursive_best_first_search,
     compare_searchers,
 )
@@ -18,44 +39,272 @@ import numpy as np
 
 
 class Board:
-    """Representação interna de um tabuleiro de Takuzu."""
+    """Representação interna de um tabuleiro de Takuzu.
+
+    Cada linha e cada coluna é guardada como um par de máscaras de bits
+    (uns / casas preenchidas), em que o bit j de uma linha corresponde à
+    coluna j e o bit i de uma coluna corresponde à linha i. Os domínios
+    são guardados como dois planos de bits por linha: o bit j de
+    zero_domains[i] (resp. one_domains[i]) indica se a posição (i, j)
+    ainda pode tomar o valor 0 (resp. 1).
+
+    O número de 0s, 1s e posições livres (2s) de cada linha e coluna é
+    mantido em row_counts e col_counts, na posição 3 * índice + valor, e
+    atualizado a cada colocação.
+
+    O tabuleiro mantém também um hash de Zobrist dos valores colocados,
+    atualizado a cada colocação, para que tabuleiros iguais obtidos por
+    ordens de colocação diferentes sejam reconhecidos em tempo constante.
+
+    Para a regra das linhas e colunas iguais, são mantidos dois índices por
+    orientação, indexados pela máscara de uns de uma linha completa: as
+    linhas completas com essa máscara (complete_rows / complete_cols) e as
+    linhas com uma só posição livre que, preenchida com 0 ou com 1, ficariam
+    com essa máscara (near_rows / near_cols). Os valores são máscaras de bits
+    com os índices das linhas (ou colunas). Como só mudam quando uma linha
+    fica (quase) completa, os índices são partilhados pelas cópias do
+    tabuleiro e só são copiados quando um deles for alterado.
+
+    Até LINE_TABLE_MAX_SIZE, cada linha e coluna guarda ainda as linhas
+    válidas (ver get_valid_lines) com que ainda pode ser completada
+    (row_lines / col_lines). As linhas e colunas cujos domínios mudam ficam
+    marcadas em dirty_rows / dirty_cols e as suas linhas válidas são
+    filtradas por propagate. As posições em que todas essas linhas têm o
+    mesmo valor ficam com esse valor forçado.
+
+    Se rule_times não for None, recalculate_domains_after_placing e propagate
+    somam-lhe o tempo gasto em cada regra, indexado pelo nome da regra. O
+    dicionário é partilhado pelas cópias do tabuleiro (ver profile_solve)."""
 
-    matrix: Tuple[Tuple[int, ...], ...]
-    domains: Tuple[Tuple[Tuple[int, ...], ...], ...]
     size: int
+    full_mask: int
+    row_ones: List[int]
+    row_filled: List[int]
+    col_ones: List[int]
+    col_filled: List[int]
+    row_counts: List[int]
+    col_counts: List[int]
+    zero_domains: List[int]
+    one_domains: List[int]
     free_squares: int
+    zobrist: int
+    zobrist_keys: List[int]
+    complete_rows: Dict[int, int]
+    complete_cols: Dict[int, int]
+    near_rows: Dict[int, int]
+    near_cols: Dict[int, int]
+    shared_indexes: bool
+    row_lines: Optional[List[Tuple[int, ...]]]
+    col_lines: Optional[List[Tuple[int, ...]]]
+    trail: Optional[List[Tuple[Union[List[int], List[Tuple[int, ...]], Dict[int, int]], int, Optional[object]]]]
+    pending: int
+    dirty_rows: int
+    dirty_cols: int
+    rule_times: Optional[Dict[str, float]]
+
+    # Domínio correspondente a cada combinação (pode ser 0) | (pode ser 1) << 1
+    DOMAINS = ((), (0,), (1,), (0, 1))
+    # Chaves de Zobrist por tamanho do tabuleiro, indexadas por 2 * (row * size + col) + value
+    ZOBRIST_KEYS: Dict[int, List[int]] = {}
+    # Linhas válidas por tamanho do tabuleiro (ver get_valid_lines)
+    LINE_TABLES: Dict[int, Tuple[int, ...]] = {}
+    # Tamanho máximo para o qual são usadas as linhas válidas (há 52 404 linhas válidas de tamanho 24)
+    LINE_TABLE_MAX_SIZE = 24
 
     def __init__(
         self,
-        matrix: Tuple[Tuple[int, ...], ...],
-        domains: Tuple[Tuple[Tuple[int, ...], ...], ...],
         size: int,
+        row_ones: List[int],
+        row_filled: List[int],
+        col_ones: List[int],
+        col_filled: List[int],
+        row_counts: List[int],
+        col_counts: List[int],
+        zero_domains: List[int],
+        one_domains: List[int],
         free_squares: int,
+        zobrist: int,
+        complete_rows: Dict[int, int],
+        complete_cols: Dict[int, int],
+        near_rows: Dict[int, int],
+        near_cols: Dict[int, int],
+        row_lines: Optional[List[Tuple[int, ...]]],
+        col_lines: Optional[List[Tuple[int, ...]]],
     ):
         """Construtor.
-        Recebe uma matriz de inteiros representando o tabuleiro.
+        Recebe as máscaras de bits das linhas, colunas e domínios do tabuleiro,
+        as contagens de valores por linha e coluna, o respetivo hash de Zobrist,
+        os índices de linhas e colunas completas e as linhas válidas com que
+        cada linha e coluna ainda pode ser completada.
         """
 
-        self.matrix = matrix
-        self.domains = domains
         self.size = size
+        self.full_mask = (1 << size) - 1
+        self.row_ones = row_ones
+        self.row_filled = row_filled
+        self.col_ones = col_ones
+        self.col_filled = col_filled
+        self.row_counts = row_counts
+        self.col_counts = col_counts
+        self.zero_domains = zero_domains
+        self.one_domains = one_domains
         self.free_squares = free_squares
+        self.zobrist = zobrist
+        self.zobrist_keys = Board.get_zobrist_keys(size)
+        self.complete_rows = complete_rows
+        self.complete_cols = complete_cols
+        self.near_rows = near_rows
+        self.near_cols = near_cols
+        self.shared_indexes = False
+        self.row_lines = row_lines
+        self.col_lines = col_lines
+        self.trail = None
+        self.pending = 0
+        self.dirty_rows = 0
+        self.dirty_cols = 0
+        self.rule_times = None
+
+    @staticmethod
+    def empty(size: int) -> "Board":
+        """Devolve um tabuleiro vazio com o tamanho indicado."""
+
+        full_mask = (1 << size) - 1
+        lines = Board.get_valid_lines(size) if size <= Board.LINE_TABLE_MAX_SIZE else None
+        return Board(
+            size,
+            [0] * size,
+            [0] * size,
+            [0] * size,
+            [0] * size,
+            [0, 0, size] * size,
+            [0, 0, size] * size,
+            [full_mask] * size,
+            [full_mask] * size,
+            size * size,
+            0,
+            {},
+            {},
+            {},
+            {},
+            [lines] * size if lines is not None else None,
+            [lines] * size if lines is not None else None,
+        )
+
+    @staticmethod
+    def get_valid_lines(size: int) -> Tuple[int, ...]:
+        """Devolve as máscaras de uns de todas as linhas válidas do tamanho
+        indicado, isto é, sem três valores iguais seguidos e com ~tantos 0s
+        como 1s. São calculadas uma vez por tamanho."""
+
+        lines = Board.LINE_TABLES.get(size)
+        if lines is None:
+            max_count = (size // 2) + (size % 2)
+            found: List[int] = []
+            # (máscara, posição, número de 1s, valor anterior, comprimento da sequência atual)
+            stack = [(0, 0, 0, -1, 0)]
+            while stack:
+                (mask, i, ones, last, run) = stack.pop()
+                if i == size:
+                    found.append(mask)
+                    continue
+                for value in (1, 0):
+                    if value == last and run == 2:
+                        continue
+                    if (ones if value else i - ones) >= max_count:
+                        continue
+                    stack.append((mask | (value << i), i + 1, ones + value, value, run + 1 if value == last else 1))
+            lines = Board.LINE_TABLES.setdefault(size, tuple(sorted(found)))
+        return lines
+
+    @staticmethod
+    def get_zobrist_keys(size: int) -> List[int]:
+        """Devolve as chaves de Zobrist para tabuleiros do tamanho indicado.
+        São geradas de forma determinística, pelo que são iguais em todos os processos."""
+
+        keys = Board.ZOBRIST_KEYS.get(size)
+        if keys is None:
+            generator = Random(size)
+            keys = Board.ZOBRIST_KEYS.setdefault(size, [generator.getrandbits(64) for _ in range(2 * size * size)])
+        return keys
+
+    def copy(self) -> "Board":
+        """Devolve uma cópia independente do tabuleiro."""
+
+        copy = Board(
+            self.size,
+            self.row_ones.copy(),
+            self.row_filled.copy(),
+            self.col_ones.copy(),
+            self.col_filled.copy(),
+            self.row_counts.copy(),
+            self.col_counts.copy(),
+            self.zero_domains.copy(),
+            self.one_domains.copy(),
+            self.free_squares,
+            self.zobrist,
+            self.complete_rows,
+            self.complete_cols,
+            self.near_rows,
+            self.near_cols,
+            self.row_lines.copy() if self.row_lines is not None else None,
+            self.col_lines.copy() if self.col_lines is not None else None,
+        )
+        self.shared_indexes = copy.shared_indexes = True
+        copy.rule_times = self.rule_times
+        return copy
+
+    def __eq__(self, other: object) -> bool:
+        """Devolve True se os dois tabuleiros tiverem os mesmos valores colocados."""
+
+        return (
+            isinstance(other, Board)
+            and self.zobrist == other.zobrist
+            and self.size == other.size
+            and self.row_filled == other.row_filled
+            and self.row_ones == other.row_ones
+        )
+
+    def __hash__(self) -> int:
+        """Devolve o hash de Zobrist dos valores colocados."""
+
+        return self.zobrist
+
+    def __getstate__(self) -> Dict[str, object]:
+        """Estado a serializar (por exemplo, para enviar o tabuleiro para outro
+        processo). As chaves de Zobrist e o rasto não são enviados."""
+
+        state = self.__dict__.copy()
+        del state["zobrist_keys"]
+        state["trail"] = None
+        return state
+
+    def __setstate__(self, state: Dict[str, object]) -> None:
+        """Reconstrói o tabuleiro a partir do estado serializado."""
+
+        self.__dict__.update(state)
+        self.zobrist_keys = Board.get_zobrist_keys(self.size)
 
     def __str__(self) -> str:
         """Representação externa do tabuleiro."""
 
-        return "\n".join(["\t".join(str(x) for x in row) for row in self.matrix])
+        return "\n".join(["\t".join(str(x) for x in self.get_row(row)) for row in range(self.size)])
 
     def __repr__(self) -> str:
         """Representação interna do tabuleiro."""
 
-        return f"Board({self.matrix}, {self.domains}, {self.size}, {self.free_squares})"
+        return (
+            f"Board({self.size}, {self.row_ones}, {self.row_filled}, {self.col_ones}, {self.col_filled}, "
+            f"{self.row_counts}, {self.col_counts}, {self.zero_domains}, {self.one_domains}, "
+            f"{self.free_squares}, {self.zobrist})"
+        )
 
     def get_number(self, row: int, col: int) -> Optional[int]:
         """Devolve o valor na respetiva posição do tabuleiro, ou None se a posição for inválida."""
 
         if 0 <= row < self.size and 0 <= col < self.size:
-            return self.matrix[row][col]
+            if not (self.row_filled[row] >> col) & 1:
+                return 2
+            return (self.row_ones[row] >> col) & 1
         else:
             return None
 
@@ -63,19 +312,19 @@ class Board:
         """Devolve o domínio da posição indicada."""
 
         if 0 <= row < self.size and 0 <= col < self.size:
-            return self.domains[row][col]
+            return Board.DOMAINS[((self.zero_domains[row] >> col) & 1) | ((self.one_domains[row] >> col) & 1) << 1]
         else:
             return ()
 
     def get_column(self, col: int) -> Tuple[int, ...]:
         """Devolve a coluna indicada."""
 
-        return tuple(row[col] for row in self.matrix)
+        return tuple(self.get_number(row, col) for row in range(self.size))  # type: ignore
 
     def get_row(self, row: int) -> Tuple[int, ...]:
         """Devolve a linha indicada."""
 
-        return self.matrix[row]
+        return tuple(self.get_number(row, col) for col in range(self.size))  # type: ignore
 
     def adjacent_vertical_numbers(self, row: int, col: int) -> Tuple[Optional[int], Optional[int]]:
         """Devolve os valores imediatamente abaixo e acima,
@@ -92,23 +341,239 @@ class Board:
     def count_col(self, col: int, num: int) -> int:
         """Devolve o número de num na coluna indicada."""
 
-        return self.get_column(col).count(num)
+        return self.col_counts[3 * col + num]
 
     def count_row(self, row: int, num: int) -> int:
         """Devolve o número de num na linha indicada."""
 
-        return self.get_row(row).count(num)
+        return self.row_counts[3 * row + num]
 
-    def place(self, row: int, col: int, value: int) -> "Board":
-        """Devolve um novo tabuleiro com o valor colocado na posição indicada."""
+    def checkpoint(self) -> Tuple[int, int, int]:
+        """Devolve um ponto de retorno para o estado atual do tabuleiro,
+        a usar com undo. Só é válido enquanto o rasto estiver ativo."""
+
+        return (len(self.trail), self.free_squares, self.zobrist)  # type: ignore
 
-        new_matrix = tuple(
-            tuple(value if (i == row and j == col) else self.matrix[i][j] for j in range(self.size))
-            for i in range(self.size)
+    def undo(self, checkpoint: Tuple[int, int, int]) -> None:
+        """Desfaz todas as alterações registadas no rasto desde o ponto de retorno indicado."""
+
+        (length, free_squares, self.zobrist) = checkpoint
+        trail = self.trail
+        while len(trail) > length:  # type: ignore
+            (lines, index, old) = trail.pop()  # type: ignore
+            if old is None:
+                del lines[index]
+            else:
+                lines[index] = old
+        self.free_squares = free_squares
+
+    def update_index(self, name: str, key: int, add: int, remove: int) -> None:
+        """Acrescenta as linhas em add e retira as linhas em remove da entrada
+        key do índice com o nome indicado (ver a descrição da classe)."""
+
+        if self.shared_indexes:
+            self.complete_rows = self.complete_rows.copy()
+            self.complete_cols = self.complete_cols.copy()
+            self.near_rows = self.near_rows.copy()
+            self.near_cols = self.near_cols.copy()
+            self.shared_indexes = False
+
+        index = getattr(self, name)
+        old = index.get(key)
+        new = ((old or 0) | add) & ~remove
+        if self.trail is not None:
+            self.trail.append((index, key, old))
+        if new:
+            index[key] = new
+        elif old is not None:
+            del index[key]
+
+    def set_number(self, row: int, col: int, value: int) -> None:
+        """Coloca o valor na posição indicada, alterando o próprio tabuleiro.
+        Não recalcula os domínios das restantes posições."""
+
+        row_bit = 1 << col
+        col_bit = 1 << row
+        if self.trail is not None:
+            self.trail.extend(
+                (lines, index, lines[index])
+                for (lines, index) in (
+                    (self.row_ones, row),
+                    (self.row_filled, row),
+                    (self.col_ones, col),
+                    (self.col_filled, col),
+                    (self.row_counts, 3 * row + 2),
+                    (self.row_counts, 3 * row + value),
+                    (self.col_counts, 3 * col + 2),
+                    (self.col_counts, 3 * col + value),
+                    (self.zero_domains, row),
+                    (self.one_domains, row),
+                )
+            )
+        self.row_filled[row] |= row_bit
+        self.col_filled[col] |= col_bit
+        if value:
+            self.row_ones[row] |= row_bit
+            self.col_ones[col] |= col_bit
+            self.zero_domains[row] &= ~row_bit
+            self.one_domains[row] |= row_bit
+        else:
+            self.zero_domains[row] |= row_bit
+            self.one_domains[row] &= ~row_bit
+        self.row_counts[3 * row + 2] -= 1
+        self.row_counts[3 * row + value] += 1
+        self.col_counts[3 * col + 2] -= 1
+        self.col_counts[3 * col + value] += 1
+        self.free_squares -= 1
+        self.zobrist ^= self.zobrist_keys[2 * (row * self.size + col) + value]
+
+        if self.row_counts[3 * row + 2] <= 1:
+            row_free = self.full_mask & ~self.row_filled[row]
+            self.index_line(row, row_bit, self.row_ones[row], row_free, "complete_rows", "near_rows")
+        if self.col_counts[3 * col + 2] <= 1:
+            col_free = self.full_mask & ~self.col_filled[col]
+            self.index_line(col, col_bit, self.col_ones[col], col_free, "complete_cols", "near_cols")
+
+    def index_line(self, key: int, bit: int, ones: int, free: int, complete: str, near: str) -> None:
+        """Atualiza os índices (com os nomes indicados) de linhas completas e
+        quase completas depois de ser preenchida a posição bit da linha (ou
+        coluna) key, que ficou com as máscaras de uns e de posições livres
+        indicadas."""
+
+        if not free:
+            # A linha deixou de ter uma só posição livre (a que foi agora preenchida)
+            self.update_index(near, ones & ~bit, 0, 1 << key)
+            self.update_index(near, ones | bit, 0, 1 << key)
+            self.update_index(complete, ones, 1 << key, 0)
+        else:
+            self.update_index(near, ones, 1 << key, 0)
+            self.update_index(near, ones | free, 1 << key, 0)
+
+    def assign(self, row: int, col: int, value: int) -> bool:
+        """Coloca o valor na posição indicada e propaga as suas consequências,
+        alterando o próprio tabuleiro. Devolve False se o tabuleiro resultante
+        for impossível."""
+
+        self.set_number(row, col, value)
+        self.recalculate_domains_after_placing(row, col, value)
+        return self.propagate()
+
+    def assign_row(self, row: int, line: int) -> bool:
+        """Completa a linha indicada com a linha válida line (bit j é o valor
+        da coluna j) e propaga as consequências, como assign.
+
+        As posições são preenchidas uma a uma, recalculando os domínios após
+        cada colocação, para que as regras das colunas (por exemplo, duas
+        colunas que ficariam completas e iguais) se apliquem às posições
+        seguintes da linha. Se o valor que a linha dá a uma posição já tiver
+        sido retirado do seu domínio, a posição fica sem valores possíveis e
+        devolve False."""
+
+        free = self.full_mask & ~self.row_filled[row]
+        while free:
+            low = free & -free
+            col = low.bit_length() - 1
+            free ^= low
+            value = (line >> col) & 1
+            if not (self.one_domains[row] if value else self.zero_domains[row]) & low:
+                self.restrict_row(row, low, low)  # impossível
+                break
+            self.set_number(row, col, value)
+            self.recalculate_domains_after_placing(row, col, value)
+
+        return self.propagate()
+
+    def line_completions(self, row: int) -> Tuple[int, ...]:
+        """Devolve as linhas válidas com que a linha indicada ainda pode ser
+        completada, de acordo com os domínios das suas posições livres."""
+
+        free = self.full_mask & ~self.row_filled[row]
+        cant_zero = free & ~self.zero_domains[row]
+        cant_one = free & ~self.one_domains[row]
+        ones = self.row_ones[row]
+        return tuple(
+            line
+            for line in self.row_lines[row]
+            if not line & cant_one and not ~line & cant_zero and line & ~free == ones and line not in self.complete_rows
         )
 
-        new_board = Board(new_matrix, self.domains, self.size, self.free_squares - 1)
-        new_board.recalculate_domains_after_placing(row, col, value)
+    def propagate(self) -> bool:
+        """Coloca os valores forçados (posições com um só valor possível) das
+        linhas pendentes, voltando a aplicar as regras após cada colocação, e
+        filtra as linhas válidas das linhas e colunas cujos domínios mudaram,
+        até não haver mais alterações. Devolve False se alguma posição ficar
+        sem valores possíveis."""
+
+        while True:
+            while self.pending:
+                low = self.pending & -self.pending
+                row = low.bit_length() - 1
+                free = self.full_mask & ~self.row_filled[row]
+                can_zero = self.zero_domains[row] & free
+                can_one = self.one_domains[row] & free
+                if free & ~(can_zero | can_one):
+                    self.pending = self.dirty_rows = self.dirty_cols = 0
+                    return False
+
+                forced = can_zero ^ can_one
+                if not forced:
+                    self.pending ^= low
+                    continue
+
+                bit = forced & -forced
+                col = bit.bit_length() - 1
+                value = 1 if can_one & bit else 0
+                self.set_number(row, col, value)
+                self.recalculate_domains_after_placing(row, col, value)
+
+            if self.row_lines is None or not (self.dirty_rows or self.dirty_cols):
+                self.dirty_rows = self.dirty_cols = 0
+                return True
+            self.restrict_dirty_lines()
+
+    def restrict_dirty_lines(self) -> None:
+        """Só permite completar cada linha e coluna marcada em dirty_rows e
+        dirty_cols com uma linha válida, diferente das linhas completas (ver
+        restrict_to_valid_lines). As restrições que daí resultam marcam as
+        linhas pendentes e as linhas e colunas cujos domínios mudaram."""
+
+        rule_times = self.rule_times
+        if rule_times is not None:
+            clock = time.perf_counter()
+
+        while self.dirty_rows:
+            low = self.dirty_rows & -self.dirty_rows
+            row = low.bit_length() - 1
+            self.restrict_to_valid_lines(
+                row, self.row_lines, self.row_filled[row], self.row_domains(row), self.complete_rows, self.restrict_row
+            )
+            # A linha acabou de ser filtrada com os domínios que resultam da sua própria restrição
+            self.dirty_rows &= ~low
+        while self.dirty_cols:
+            low = self.dirty_cols & -self.dirty_cols
+            col = low.bit_length() - 1
+            self.restrict_to_valid_lines(
+                col, self.col_lines, self.col_filled[col], self.col_domains(col), self.complete_cols, self.restrict_col
+            )
+            self.dirty_cols &= ~low
+
+        if rule_times is not None:
+            self.time_rule("valid_lines", clock)
+
+    def free_by_domain_size(self, row: int) -> Tuple[int, int, int]:
+        """Devolve as máscaras das posições livres da linha indicada cujo
+        domínio tem, respetivamente, 0, 1 e 2 valores."""
+
+        free = self.full_mask & ~self.row_filled[row]
+        can_zero = self.zero_domains[row]
+        can_one = self.one_domains[row]
+        return (free & ~(can_zero | can_one), free & (can_zero ^ can_one), free & can_zero & can_one)
+
+    def place(self, row: int, col: int, value: int) -> "Board":
+        """Devolve um novo tabuleiro com o valor colocado na posição indicada."""
+
+        new_board = self.copy()
+        new_board.assign(row, col, value)  # se for impossível, deixa de haver ações
 
         return new_board
 
@@ -117,78 +582,160 @@ class Board:
 
         return self.free_squares == 0
 
+    def restrict_row(self, row: int, not_zero: int, not_one: int) -> None:
+        """Retira o 0 (resp. o 1) dos domínios das posições da linha
+        indicadas pela máscara not_zero (resp. not_one)."""
+
+        zeros = self.zero_domains[row]
+        ones = self.one_domains[row]
+        if zeros & not_zero or ones & not_one:
+            if self.trail is not None:
+                self.trail.append((self.zero_domains, row, zeros))
+                self.trail.append((self.one_domains, row, ones))
+            self.zero_domains[row] = zeros & ~not_zero
+            self.one_domains[row] = ones & ~not_one
+            self.pending |= 1 << row
+            self.dirty_rows |= 1 << row
+            self.dirty_cols |= (zeros & not_zero) | (ones & not_one)
+
+    def restrict_col(self, col: int, not_zero: int, not_one: int) -> None:
+        """Retira o 0 (resp. o 1) dos domínios das posições da coluna
+        indicadas pela máscara not_zero (resp. not_one)."""
+
+        col_bit = 1 << col
+        for (domains, mask) in ((self.zero_domains, not_zero), (self.one_domains, not_one)):
+            while mask:
+                low = mask & -mask
+                row = low.bit_length() - 1
+                if domains[row] & col_bit:
+                    if self.trail is not None:
+                        self.trail.append((domains, row, domains[row]))
+                    domains[row] &= ~col_bit
+                    self.pending |= low
+                    self.dirty_rows |= low
+                    self.dirty_cols |= col_bit
+                mask ^= low
+
     def recalculate_domains_after_placing(self, row: int, col: int, value: int) -> None:
         """Recalcula os domínios após a introdução de um valor na posição (row, col)."""
 
-        new_domains: Dict[Tuple[int, int], Set[int]] = {(row, col): {value}}
-        get_new_domain = (
-            lambda pos: new_domains[pos]
-            # redundant check but avoids unnecesarily getting domain
-            if pos in new_domains
-            else new_domains.setdefault(pos, set(self.get_domain(*pos)))
-        )
+        full_mask = self.full_mask
+        max_count = (self.size // 2) + (self.size % 2)
+        rule_times = self.rule_times
+        if rule_times is not None:
+            clock = time.perf_counter()
 
-        # Não permitir três números adjacentes iguais
-        for (closest, furthest) in (
-            *(((row + delta, col), (row + 2 * delta, col)) for delta in (-1, 1)),
-            *(((row - delta, col), (row + delta, col)) for delta in (-1, 1)),
-            *(((row, col + delta), (row, col + 2 * delta)) for delta in (-1, 1)),
-            *(((row, col - delta), (row, col + delta)) for delta in (-1, 1)),
-        ):
-            closest_val = self.get_number(*closest)
-            furthest_val = self.get_number(*furthest)
-            if closest_val == 2 and furthest_val == value:
-                get_new_domain(closest).difference_update((value,))
-            elif closest_val == value and furthest_val == 2:
-                get_new_domain(furthest).difference_update((value,))
-
-        # Não permitir linhas nem colunas iguais
-        for (key, getter, counter, packer) in (
-            (row, self.get_row, self.count_row, lambda x, y: (x, y)),
-            (col, self.get_column, self.count_col, lambda x, y: (y, x)),
+        for (key, lines_ones, lines_filled, lines_counts, complete, near, restrict) in (
+            (row, self.row_ones, self.row_filled, self.row_counts, self.complete_rows, self.near_rows, self.restrict_row),
+            (col, self.col_ones, self.col_filled, self.col_counts, self.complete_cols, self.near_cols, self.restrict_col),
         ):
-            this = getter(key)
-            empty_count = counter(key, 2)
-            if empty_count == 0:
-                for i in range(self.size):
-                    if i != key and counter(i, 2) == 1:
-                        other = getter(i)
-                        empty_j = other.index(2)
-                        empty_j_domain = get_new_domain(packer(i, empty_j))
-                        for possible_value in tuple(empty_j_domain):
-                            if tuple(possible_value if j == empty_j else other[j] for j in range(self.size)) == this:
-                                empty_j_domain.difference_update((possible_value,))
-            elif empty_count == 1:
-                empty_j = this.index(2)
-                empty_j_domain = get_new_domain(packer(key, empty_j))
-                for i in range(self.size):
-                    if i != key and counter(i, 2) == 0:
-                        for possible_value in tuple(empty_j_domain):
-                            if tuple(possible_value if j == empty_j else this[j] for j in range(self.size)) == getter(i):
-                                empty_j_domain.difference_update((possible_value,))
-
-        # Número de valores por linha e coluna deve ser ~igual
-        max_diff = self.size % 2
-        for (this, packer) in (
-            (self.get_row(row), lambda other_coord: (row, other_coord)),
-            (self.get_column(col), lambda other_coord: (other_coord, col)),
-        ):
-            constraint_domain = set((0, 1))
-            for value in (0, 1):
-                if this.count(value) >= (self.size // 2) + max_diff:
-                    constraint_domain.difference_update((value,))
-            for i in range(self.size):
-                if this[i] == 2:
-                    get_new_domain(packer(i)).intersection_update(constraint_domain)
-
-        # Guardar a interseção dos domínios novos com os atuais
-        self.domains = tuple(
-            tuple(
-                tuple(new_domains.get((i, j)) or ()) if (i, j) in new_domains else self.get_domain(i, j)
-                for j in range(self.size)
-            )
-            for i in range(self.size)
+            ones = lines_ones[key]
+            filled = lines_filled[key]
+            free = full_mask & ~filled
+            not_values = [0, 0]
+
+            for (num, mask) in ((0, filled & ~ones), (1, ones)):
+                # Número de valores por linha e coluna deve ser ~igual
+                if lines_counts[3 * key + num] >= max_count:
+                    not_values[num] = free
+                    continue
+                # Não permitir três números adjacentes iguais
+                pairs = mask & (mask >> 1)
+                gaps = mask & (mask >> 2)
+                not_values[num] = ((pairs >> 1) | (pairs << 2) | (gaps << 1)) & free
+
+            if free:
+                restrict(key, *not_values)
+            if rule_times is not None:
+                clock = self.time_rule("counts_and_adjacency", clock)
+
+            # Não permitir linhas nem colunas iguais
+            if not free:
+                near_lines = near.get(ones, 0)
+                while near_lines:
+                    low = near_lines & -near_lines
+                    i = low.bit_length() - 1
+                    near_lines ^= low
+                    other_free = full_mask & ~lines_filled[i]
+                    if lines_ones[i] == ones:
+                        restrict(i, other_free, 0)
+                    else:
+                        restrict(i, 0, other_free)
+            elif not free & (free - 1):
+                if ones | free in complete:
+                    restrict(key, 0, free)
+                if ones in complete:
+                    restrict(key, free, 0)
+            if rule_times is not None:
+                clock = self.time_rule("distinct_lines", clock)
+
+        # Só permitir completar cada linha e coluna com uma linha válida (ver propagate). Uma linha que fica
+        # completa deixa de poder ser usada para completar as restantes linhas
+        self.dirty_rows |= full_mask if self.row_filled[row] == full_mask else 1 << row
+        self.dirty_cols |= full_mask if self.col_filled[col] == full_mask else 1 << col
+
+    def time_rule(self, rule: str, start: float) -> float:
+        """Soma a rule_times o tempo decorrido desde start na regra indicada.
+        Devolve o instante atual, a partir do qual é medida a regra seguinte."""
+
+        now = time.perf_counter()
+        self.rule_times[rule] = self.rule_times.get(rule, 0.0) + now - start
+        return now
+
+    def row_domains(self, row: int) -> Tuple[int, int]:
+        """Devolve as máscaras das posições da linha que podem ser 0 e 1, respetivamente."""
+
+        return (self.zero_domains[row], self.one_domains[row])
+
+    def col_domains(self, col: int) -> Tuple[int, int]:
+        """Devolve as máscaras das posições da coluna que podem ser 0 e 1, respetivamente."""
+
+        can_zero = can_one = 0
+        for row in range(self.size):
+            can_zero |= ((self.zero_domains[row] >> col) & 1) << row
+            can_one |= ((self.one_domains[row] >> col) & 1) << row
+        return (can_zero, can_one)
+
+    def restrict_to_valid_lines(
+        self,
+        key: int,
+        lines: List[Tuple[int, ...]],
+        filled: int,
+        domains: Tuple[int, int],
+        complete: Dict[int, int],
+        restrict: Callable[[int, int, int], None],
+    ) -> None:
+        """Filtra as linhas válidas com que a linha (ou coluna) key ainda pode
+        ser completada, de acordo com os domínios das suas posições e com as
+        linhas completas, e restringe os domínios das posições livres aos
+        valores que essas linhas lhes dão."""
+
+        free = self.full_mask & ~filled
+        if not free:
+            return
+
+        cant_zero = self.full_mask & ~domains[0]
+        cant_one = self.full_mask & ~domains[1]
+        candidates = lines[key]
+        remaining = tuple(
+            line for line in candidates if not line & cant_one and not ~line & cant_zero and line not in complete
         )
+        if len(remaining) == len(candidates):
+            return
+
+        if self.trail is not None:
+            self.trail.append((lines, key, candidates))
+        lines[key] = remaining
+
+        all_ones = free
+        any_ones = 0
+        for line in remaining:
+            all_ones &= line
+            any_ones |= line
+        if not remaining:
+            restrict(key, free, free)  # impossível
+        else:
+            restrict(key, all_ones, free & ~any_ones)
 
     @staticmethod
     def parse_instance_from_stdin() -> "Board":
@@ -202,48 +749,466 @@ class Board:
             > stdin.readline()
         """
 
-        size = int(stdin.readline())
-        free_squares = size * size
-        matrix: List[Tuple[int, ...]] = []
-        domains: List[Tuple[Tuple[int, ...]]] = []
+        return Board.parse_instance(stdin)  # type: ignore
+
+    @staticmethod
+    def read_grid(stream: TextIO) -> Optional[List[List[int]]]:
+        """Lê os valores do próximo tabuleiro da stream indicada (2 nas
+        posições livres), ignorando linhas vazias antes dele, ou devolve None
+        se a stream terminar antes de haver um tabuleiro."""
+
+        line = stream.readline()
+        while line and not line.strip():
+            line = stream.readline()
+        if not line:
+            return None
+
+        size = int(line)
+        return [[int(entry) for entry in stream.readline().split("\t")] for _ in range(size)]
+
+    @staticmethod
+    def parse_instance(stream: TextIO) -> Optional["Board"]:
+        """Lê o próximo tabuleiro da stream indicada, ignorando linhas vazias
+        antes dele, e retorna uma instância da classe Board, ou None se a
+        stream terminar antes de haver um tabuleiro."""
+
+        grid = Board.read_grid(stream)
+        return Board.from_grid(grid) if grid is not None else None
+
+    @staticmethod
+    def from_grid(grid: List[List[int]], rule_times: Optional[Dict[str, float]] = None) -> "Board":
+        """Devolve o tabuleiro com os valores indicados (2 nas posições livres,
+        como em read_grid), já propagados. Se for indicado rule_times, é-lhe
+        somado o tempo gasto em cada regra durante a propagação inicial."""
+
+        size = len(grid)
+        board = Board.empty(size)
+        board.rule_times = rule_times
         needs_revision: List[Tuple[int, int, int]] = []
-        for _ in range(size):
-            row: List[int] = []
-            row_domains: List[Tuple[int, ...]] = []
-            for entry in stdin.readline().split("\t"):
-                row.append(int(entry))
-                if int(entry) == 2:
-                    row_domains.append((0, 1))
-                else:
-                    row_domains.append((int(entry),))
-                    needs_revision.append((len(matrix), len(row) - 1, int(entry)))
-                    free_squares -= 1
-            matrix.append(tuple(row))
-            domains.append(tuple(row_domains))
-
-        board = Board(tuple(matrix), tuple(domains), size, free_squares)
+        for (row, entries) in enumerate(grid):
+            for (col, entry) in enumerate(entries):
+                if entry != 2:
+                    board.set_number(row, col, entry)
+                    needs_revision.append((row, col, entry))
+
         for action in needs_revision:
             board.recalculate_domains_after_placing(*action)
+        board.propagate()
+
+        return board
+
+    @staticmethod
+    def parse_instances(paths: List[str]) -> Iterator["Board"]:
+        """Lê todos os tabuleiros dos ficheiros indicados, ou do standard input
+        se não for indicado nenhum. Cada ficheiro pode ter vários tabuleiros
+        seguidos. Das diretorias, são lidos os ficheiros input_* e *.in, por
+        ordem alfabética."""
+
+        for grid in Board.read_grids(paths):
+            yield Board.from_grid(grid)
+
+    @staticmethod
+    def read_grids(paths: List[str]) -> Iterator[List[List[int]]]:
+        """Lê os valores de todos os tabuleiros dos ficheiros indicados (ver
+        parse_instances e read_grid), sem os propagar. Cada tabuleiro só é lido
+        quando for pedido."""
+
+        for stream in Board.open_instances(paths):
+            with stream:
+                while (grid := Board.read_grid(stream)) is not None:
+                    yield grid
+
+    @staticmethod
+    def open_instances(paths: List[str]) -> Iterator[TextIO]:
+        """Abre, por ordem, os ficheiros com tabuleiros indicados (ver parse_instances)."""
+
+        if not paths:
+            yield open(stdin.fileno(), closefd=False)
+        for path in paths:
+            if os.path.isdir(path):
+                for name in sorted(os.listdir(path)):
+                    if name.startswith("input_") or name.endswith(".in"):
+                        yield open(os.path.join(path, name))
+            else:
+                yield open(path)
+
+
+# Valores comparados com cada linha por line_rules, numa forma que se alinha com (..., linha, posição)
+LINE_VALUES = np.array([0, 1], dtype=np.int8)[:, None, None]
+
+
+def line_rules(lines: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Aplica as regras de recalculate_domains_after_placing a todas as linhas
+    de lines (array int8 de forma (..., size, size), com 2 nas posições
+    livres) de uma só vez. Devolve as máscaras das posições livres que não
+    podem ser 0 e 1, empilhadas numa forma (..., 2, size, size), e, para cada
+    conjunto de linhas, se alguma delas já viola as regras."""
+
+    size = lines.shape[-1]
+    max_count = size // 2 + size % 2
+    free = lines == 2
+    placed = lines[..., None, :, :] == LINE_VALUES  # (..., valor, linha, posição)
+    counts = placed.sum(axis=-1)
+    forbidden = np.zeros(placed.shape, dtype=bool)
+
+    # Número de valores por linha deve ser ~igual
+    forbidden |= (counts >= max_count)[..., None]
+    # Não permitir três números adjacentes iguais (pares seguidos e pares separados por uma posição)
+    pairs = placed[..., :-1] & placed[..., 1:]
+    forbidden[..., :-2] |= pairs[..., 1:]
+    forbidden[..., 2:] |= pairs[..., :-1]
+    forbidden[..., 1:-1] |= placed[..., :-2] & placed[..., 2:]
+    invalid = (counts > max_count).any(axis=(-2, -1)) | (pairs[..., :-1] & pairs[..., 1:]).any(axis=(-3, -2, -1))
+
+    # Não permitir linhas iguais: compara cada linha com todas as outras
+    free_counts = size - counts.sum(axis=-2)
+    complete = free_counts == 0
+    equal = lines[..., :, None, :] == lines[..., None, :, :]
+    agree = (equal | free[..., :, None, :]).all(axis=-1) & (free_counts == 1)[..., :, None] & complete[..., None, :]
+    # Valor que cada linha completa tem na posição livre de cada linha quase completa
+    other = (free[..., :, None, :] & (lines[..., None, :, :] == 1)).any(axis=-1)
+    forbidden[..., 0, :, :] |= (agree & ~other).any(axis=-1)[..., None]
+    forbidden[..., 1, :, :] |= (agree & other).any(axis=-1)[..., None]
+    # Cada linha completa é igual a si própria; se houver mais pares iguais, há linhas repetidas
+    duplicates = (equal.all(axis=-1) & complete[..., :, None] & complete[..., None, :]).sum(axis=(-2, -1))
+    invalid |= duplicates > complete.sum(axis=-1)
+
+    return (forbidden & free[..., None, :, :], invalid)
+
+
+def valid_line_rules(lines: np.ndarray) -> np.ndarray:
+    """Como restrict_to_valid_lines, para todas as linhas de lines (ver
+    line_rules) de uma só vez: só permite a cada posição livre os valores que
+    lhe dão as linhas válidas (ver Board.get_valid_lines) que concordam com
+    os valores já colocados e não são iguais a nenhuma linha completa. As
+    linhas são comparadas com todas as linhas válidas com produtos de
+    matrizes. Devolve as máscaras das posições livres que não podem ser 0 e
+    1, na mesma forma que line_rules."""
+
+    size = lines.shape[-1]
+    (table, masks) = NumpyBoard.get_line_arrays(size)
+    free = lines == 2
+    ones = lines == 1
+    # Número de posições preenchidas em que cada linha difere de cada linha válida
+    signs = ones.astype(np.float32) - (lines == 0)
+    compatible = (signs @ table.T) == ones.sum(axis=-1, dtype=np.float32)[..., None]
+
+    # Excluir as linhas válidas iguais a uma linha completa (linhas completas inválidas ficam com o índice len(masks))
+    values = ones.astype(np.int64) @ (np.int64(1) << np.arange(size, dtype=np.int64))
+    index = np.minimum(np.searchsorted(masks, values), len(masks) - 1)
+    index = np.where(~free.any(axis=-1) & (masks[index] == values), index, len(masks))
+    excluded = np.zeros(lines.shape[:-2] + (len(masks) + 1,), dtype=bool)
+    np.put_along_axis(excluded, index, True, axis=-1)
+    compatible &= ~excluded[..., None, :-1]
+
+    # Número de linhas válidas compatíveis com 1 em cada posição
+    with_one = compatible.astype(np.float32) @ table
+    forbidden = np.stack([with_one == compatible.sum(axis=-1, dtype=np.float32)[..., None], with_one == 0], axis=-3)
+    return forbidden & free[..., None, :, :]
+
+
+def vectorized_domains(grid: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Calcula os domínios de todas as posições de grid (array int8 de forma
+    (..., size, size), com 2 nas posições livres), aplicando as regras às
+    linhas e às colunas de uma só vez (ver line_rules). Devolve os domínios,
+    como índices de Board.DOMAINS (as posições preenchidas ficam com o seu
+    valor), e, para cada tabuleiro, se algum valor colocado já viola as regras."""
+
+    # As colunas são as linhas do tabuleiro transposto
+    lines = np.stack([grid, grid.swapaxes(-2, -1)], axis=-3)
+    (forbidden, invalid) = line_rules(lines)
+    if grid.shape[-1] <= Board.LINE_TABLE_MAX_SIZE:
+        forbidden |= valid_line_rules(lines)
+    forbidden = forbidden[..., 0, :, :, :] | forbidden[..., 1, :, :, :].swapaxes(-2, -1)
+    domains = np.where(grid == 2, 3 - forbidden[..., 0, :, :] - 2 * forbidden[..., 1, :, :].astype(np.int8), grid + 1)
+    return (domains.astype(np.int8), invalid.any(axis=-1))
+
+
+# Estado de cada tabuleiro depois de propagate_batch
+BATCH_SOLVED = 0
+BATCH_IMPOSSIBLE = 1
+BATCH_OPEN = 2  # precisa de procura
+# Número máximo de elementos dos arrays intermédios de cada grupo de tabuleiros de propagate_batch
+BATCH_ELEMENTS = 1 << 22
+
+
+def propagate_batch(grids: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Propaga de uma só vez vários tabuleiros do mesmo tamanho, empilhados
+    num array de forma (tabuleiros, size, size) com 2 nas posições livres
+    (por exemplo, de Board.read_grid), como NumpyBoard.propagate.
+
+    Os tabuleiros são processados em grupos, para que os arrays intermédios
+    não tenham mais do que ~BATCH_ELEMENTS elementos, e cada passagem só
+    recalcula os tabuleiros do grupo que mudaram na passagem anterior.
+    Devolve os valores e os domínios propagados (que podem ser passados a
+    NumpyBoard para procurar os tabuleiros por resolver) e o estado de cada
+    tabuleiro: BATCH_SOLVED, BATCH_IMPOSSIBLE ou BATCH_OPEN."""
+
+    grids = np.array(grids, dtype=np.int8)
+    (count, size) = grids.shape[:2]
+    domains = np.zeros_like(grids)
+    invalid = np.zeros(count, dtype=bool)
+    lines = len(Board.get_valid_lines(size)) if size <= Board.LINE_TABLE_MAX_SIZE else size
+    group = max(1, BATCH_ELEMENTS // (2 * size * lines))
+
+    for start in range(0, count, group):
+        active = np.arange(start, min(start + group, count))
+        while len(active):
+            values = grids[active]
+            (new_domains, new_invalid) = vectorized_domains(values)
+            free = values == 2
+            new_invalid |= (free & (new_domains == 0)).any(axis=(-2, -1))
+            forced = free & ((new_domains == 1) | (new_domains == 2)) & ~new_invalid[:, None, None]
+            values[forced] = new_domains[forced] - 1
+            grids[active] = values
+            domains[active] = new_domains
+            invalid[active] = new_invalid
+            active = active[forced.any(axis=(-2, -1))]
+
+    # Nos tabuleiros impossíveis, as posições livres ficam sem valores possíveis
+    domains[invalid[:, None, None] & (grids == 2)] = 0
+    status = np.where((grids == 2).any(axis=(-2, -1)), BATCH_OPEN, BATCH_SOLVED)
+    status[invalid] = BATCH_IMPOSSIBLE
+    return (grids, domains, status)
+
+
+def bit_masks(bits: np.ndarray) -> List[int]:
+    """Converte cada linha de um array booleano 2-D numa máscara de bits (bit j é a coluna j)."""
+
+    return [int.from_bytes(row.tobytes(), "little") for row in np.packbits(bits, axis=-1, bitorder="little")]
+
+
+class NumpyBoard:
+    """Representação alternativa de um tabuleiro de Takuzu, com a mesma
+    interface que Board, em que os valores (2 nas posições livres) e os
+    domínios (índices de Board.DOMAINS) são guardados como arrays int8.
+
+    Em vez de revistas as linhas e colunas de cada posição colocada, as
+    regras são aplicadas a todo o tabuleiro de uma só vez, com operações
+    vetorizadas (ver vectorized_domains), e todos os valores forçados são
+    colocados ao mesmo tempo, até não haver mais alterações. Os domínios a
+    que chega são os mesmos de Board.propagate, pelo que as procuras expandem
+    os mesmos nós com as duas representações.
+
+    Depois de cada alteração são atualizadas as mesmas máscaras de bits e
+    contagens de Board (row_filled, row_counts, zero_domains, ...), para que
+    as políticas de ordenação e os métodos de consulta de Board funcionem da
+    mesma forma. Não tem índices de linhas completas nem linhas válidas
+    (row_lines é None), nem rasto: os pontos de retorno são cópias."""
+
+    DOMAINS = Board.DOMAINS
+    # Linhas válidas por tamanho do tabuleiro, como matriz de 0s e 1s e como máscaras de uns (ver get_line_arrays)
+    LINE_ARRAYS: Dict[int, Tuple[np.ndarray, np.ndarray]] = {}
+
+    def __init__(self, grid: np.ndarray, domains: np.ndarray, invalid: bool = False):
+        """Construtor.
+        Recebe os valores e os domínios do tabuleiro e se este já é impossível."""
+
+        self.size = grid.shape[0]
+        self.full_mask = (1 << self.size) - 1
+        self.grid = grid
+        self.domains = domains
+        self.invalid = invalid
+        self.row_lines = self.col_lines = None
+        self.trail = None
+        self.update_views()
+
+    @staticmethod
+    def from_grid(grid: List[List[int]]) -> "NumpyBoard":
+        """Devolve o tabuleiro com os valores indicados, já propagados."""
+
+        array = np.array(grid, dtype=np.int8)
+        board = NumpyBoard(array, np.where(array == 2, 3, array + 1).astype(np.int8))
+        board.propagate()
+        return board
+
+    @staticmethod
+    def get_line_arrays(size: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Devolve as linhas válidas do tamanho indicado (ver Board.get_valid_lines)
+        como uma matriz float32 com uma linha válida por linha e como um array
+        ordenado com as suas máscaras de uns. São calculadas uma vez por tamanho."""
+
+        arrays = NumpyBoard.LINE_ARRAYS.get(size)
+        if arrays is None:
+            masks = np.array(Board.get_valid_lines(size), dtype=np.int64)
+            table = ((masks[:, None] >> np.arange(size)) & 1).astype(np.float32)
+            arrays = NumpyBoard.LINE_ARRAYS.setdefault(size, (table, masks))
+        return arrays
+
+    @staticmethod
+    def from_board(board: Board) -> "NumpyBoard":
+        """Converte um tabuleiro de Board."""
+
+        return NumpyBoard.from_grid([list(board.get_row(row)) for row in range(board.size)])
+
+    def update_views(self) -> None:
+        """Atualiza as máscaras de bits e as contagens equivalentes às de Board."""
+
+        grid = self.grid
+        counts = [grid == 0, grid == 1, grid == 2]
+        self.row_counts = np.stack([count.sum(axis=1) for count in counts], axis=1).ravel().tolist()
+        self.col_counts = np.stack([count.sum(axis=0) for count in counts], axis=1).ravel().tolist()
+        self.free_squares = int(counts[2].sum())
+        self.row_filled = bit_masks(~counts[2])
+        self.col_filled = bit_masks(~counts[2].T)
+        self.zero_domains = bit_masks((self.domains & 1).astype(bool))
+        self.one_domains = bit_masks((self.domains & 2).astype(bool))
+
+    def copy(self) -> "NumpyBoard":
+        """Devolve uma cópia independente do tabuleiro."""
+
+        # As máscaras e contagens são substituídas (e não alteradas) por update_views, pelo que podem ser partilhadas
+        copy = NumpyBoard.__new__(NumpyBoard)
+        copy.__dict__.update(self.__dict__)
+        copy.grid = self.grid.copy()
+        copy.domains = self.domains.copy()
+        return copy
+
+    def __eq__(self, other: object) -> bool:
+        """Devolve True se os dois tabuleiros tiverem os mesmos valores colocados."""
+
+        return isinstance(other, NumpyBoard) and np.array_equal(self.grid, other.grid)
+
+    def __hash__(self) -> int:
+        """Devolve o hash dos valores colocados."""
 
+        return hash(self.grid.tobytes())
+
+    def __repr__(self) -> str:
+        """Representação interna do tabuleiro."""
+
+        return f"NumpyBoard({self.grid.tolist()}, {self.domains.tolist()}, {self.invalid})"
+
+    def get_number(self, row: int, col: int) -> Optional[int]:
+        """Devolve o valor na respetiva posição do tabuleiro, ou None se a posição for inválida."""
+
+        if 0 <= row < self.size and 0 <= col < self.size:
+            return int(self.grid[row, col])
+        else:
+            return None
+
+    def get_domain(self, row: int, col: int) -> Tuple[int, ...]:
+        """Devolve o domínio da posição indicada."""
+
+        if 0 <= row < self.size and 0 <= col < self.size:
+            return NumpyBoard.DOMAINS[self.domains[row, col]]
+        else:
+            return ()
+
+    # Consultas que só dependem dos valores e das máscaras de bits e contagens
+    __str__ = Board.__str__
+    get_column = Board.get_column
+    get_row = Board.get_row
+    adjacent_vertical_numbers = Board.adjacent_vertical_numbers
+    adjacent_horizontal_numbers = Board.adjacent_horizontal_numbers
+    count_col = Board.count_col
+    count_row = Board.count_row
+    free_by_domain_size = Board.free_by_domain_size
+
+    def checkpoint(self) -> "NumpyBoard":
+        """Devolve um ponto de retorno para o estado atual do tabuleiro, a usar com undo."""
+
+        return self.copy()
+
+    def undo(self, checkpoint: "NumpyBoard") -> None:
+        """Repõe o estado do tabuleiro no ponto de retorno indicado."""
+
+        self.__dict__.update(checkpoint.copy().__dict__)
+
+    def set_number(self, row: int, col: int, value: int) -> None:
+        """Coloca o valor na posição indicada, alterando o próprio tabuleiro.
+        Não recalcula os domínios das restantes posições."""
+
+        self.grid[row, col] = value
+        self.domains[row, col] = value + 1
+        self.free_squares -= 1
+
+    def assign(self, row: int, col: int, value: int) -> bool:
+        """Coloca o valor na posição indicada e propaga as suas consequências,
+        alterando o próprio tabuleiro. Devolve False se o tabuleiro resultante
+        for impossível."""
+
+        self.set_number(row, col, value)
+        return self.propagate()
+
+    def propagate(self) -> bool:
+        """Recalcula os domínios de todo o tabuleiro e coloca todos os valores
+        forçados, até não haver mais alterações. Se o tabuleiro for
+        impossível, as posições livres ficam sem valores possíveis (para que
+        deixe de haver ações) e devolve False. É o caso de propagate_batch
+        com um só tabuleiro."""
+
+        if not self.invalid:
+            (grids, domains, status) = propagate_batch(self.grid[None])
+            (self.grid, self.domains, self.invalid) = (grids[0], domains[0], bool(status[0] == BATCH_IMPOSSIBLE))
+            self.update_views()
+        return not self.invalid
+
+    def place(self, row: int, col: int, value: int) -> "NumpyBoard":
+        """Devolve um novo tabuleiro com o valor colocado na posição indicada."""
+
+        board = self.copy()
+        board.assign(row, col, value)
         return board
 
+    def filled(self) -> bool:
+        """Devolve True se o tabuleiro estiver completo (e for válido)."""
+
+        return self.free_squares == 0 and not self.invalid
+
+    @staticmethod
+    def parse_instance(stream: TextIO) -> Optional["NumpyBoard"]:
+        """Lê o próximo tabuleiro da stream indicada (ver Board.parse_instance)."""
+
+        grid = Board.read_grid(stream)
+        return NumpyBoard.from_grid(grid) if grid is not None else None
+
+    @staticmethod
+    def parse_instances(paths: List[str]) -> Iterator["NumpyBoard"]:
+        """Lê todos os tabuleiros dos ficheiros indicados (ver Board.parse_instances)."""
+
+        for grid in Board.read_grids(paths):
+            yield NumpyBoard.from_grid(grid)
+
+
+BACKENDS = {
+    "bitmask": Board,
+    "numpy": NumpyBoard,
+}
+
 
 class TakuzuState:
-    state_id = 0
+    # Sem __dict__, para ocupar menos memória nas fronteiras grandes
+    __slots__ = ("board", "ids", "id", "depth")
     board: Board
 
-    def __init__(self, board):
-        """Inicializa o estado com o tabuleiro indicado."""
+    def __init__(self, board, ids: Optional[Iterator[int]] = None, depth: int = 0):
+        """Inicializa o estado com o tabuleiro indicado. Os estados obtidos a
+        partir deste partilham o seu contador de identificadores (ids), que os
+        ordena pela ordem em que foram criados. Assim, cada problema tem o seu
+        contador e pode ser resolvido em simultâneo com outros. A profundidade
+        (depth) é o número de ações desde o estado inicial."""
 
         self.board = board
-        self.id = TakuzuState.state_id
-        TakuzuState.state_id += 1
+        self.ids = ids if ids is not None else count()
+        self.id = next(self.ids)
+        self.depth = depth
 
     def __lt__(self, other):
         """Devolve True se o estado for anterior a outro."""
 
         return self.id < other.id
 
+    def __eq__(self, other):
+        """Devolve True se os estados tiverem tabuleiros iguais."""
+
+        return isinstance(other, TakuzuState) and self.board == other.board
+
+    def __hash__(self):
+        """Devolve o hash do tabuleiro do estado."""
+
+        return hash(self.board)
+
     def __str__(self):
         """Representação externa do estado."""
 
@@ -257,7 +1222,7 @@ class TakuzuState:
     def place(self, row: int, col: int, value: int) -> "TakuzuState":
         """Devolve um novo estado com o valor colocado na posição indicada."""
 
-        return TakuzuState(self.board.place(row, col, value))
+        return TakuzuState(self.board.place(row, col, value), self.ids, self.depth + 1)
 
     def board_filled(self):
         """Devolve True se o tabuleiro estiver completo."""
@@ -280,12 +1245,94 @@ class TakuzuState:
         return self.board.get_number(row, col)
 
 
+def first_free_square(board: Board) -> Optional[Tuple[int, int]]:
+    """Ordem por linhas: escolhe a primeira posição livre do tabuleiro.
+    Devolve None se alguma posição livre não tiver valores possíveis."""
+
+    square = None
+    for row in range(board.size):
+        (empty, single, double) = board.free_by_domain_size(row)
+        if empty:
+            return None  # impossível
+        elif square is None and (single | double):
+            free = single | double
+            square = (row, (free & -free).bit_length() - 1)
+
+    return square
+
+
+def most_constrained_square(board: Board, degree: bool = False) -> Optional[Tuple[int, int]]:
+    """MRV: escolhe uma posição livre com o menor domínio. Em caso de empate,
+    escolhe a linha ou coluna com menos posições livres e, dentro dela, a
+    posição cuja coluna ou linha tem menos posições livres. Se degree for
+    True, desempata ainda pela posição com mais vizinhas livres (até duas
+    casas de distância), que são as que a sua colocação mais restringe.
+    Devolve None se alguma posição livre não tiver valores possíveis."""
+
+    size = board.size
+    best: Optional[Tuple[int, bool, int, int]] = None  # (livres, é coluna, índice, máscara)
+
+    for row in range(size):
+        (empty, single, double) = board.free_by_domain_size(row)
+        if empty:
+            return None  # impossível
+        elif single:
+            return (row, (single & -single).bit_length() - 1)
+        free_count = board.count_row(row, 2)
+        if free_count and (best is None or free_count < best[0]):
+            best = (free_count, False, row, double)
+
+    if best is None:
+        return None
+
+    for col in range(size):
+        free_count = board.count_col(col, 2)
+        if free_count and free_count < best[0]:
+            best = (free_count, True, col, board.full_mask & ~board.col_filled[col])
+
+    (_, is_col, key, free) = best
+    (own_filled, cross_filled, cross_counts) = (
+        (board.col_filled, board.row_filled, board.row_counts)
+        if is_col
+        else (board.row_filled, board.col_filled, board.col_counts)
+    )
+    own_free = board.full_mask & ~own_filled[key]
+    square = None
+    best_cost: Tuple[int, int] = (size + 1, 0)
+
+    while free:
+        low = free & -free
+        i = low.bit_length() - 1
+        free ^= low
+        cost = cross_counts[3 * i + 2]
+        neighbours = 0
+        if degree:
+            cross_free = board.full_mask & ~cross_filled[i]
+            neighbours = bin(own_free & ((0b11011 << i) >> 2)).count("1")
+            neighbours += bin(cross_free & ((0b11011 << key) >> 2)).count("1")
+        if (cost, -neighbours) < best_cost:
+            best_cost = (cost, -neighbours)
+            square = (i, key) if is_col else (key, i)
+
+    return square
+
+
+ORDERINGS = {
+    "row-major": first_free_square,
+    "mrv": most_constrained_square,
+    "mrv-degree": lambda board: most_constrained_square(board, degree=True),
+}
+
+
 class Takuzu(Problem):
-    def __init__(self, board: Board):
-        """O construtor especifica o estado inicial."""
+    def __init__(self, board: Board, ordering: str = "row-major"):
+        """O construtor especifica o estado inicial e a política de
+        escolha da próxima posição a preencher (ver ORDERINGS)."""
 
         initial_state = TakuzuState(board)
         super().__init__(initial_state)
+        self.ordering = ordering
+        self.choose_square = ORDERINGS[ordering]
 
     def actions(self, state: TakuzuState) -> Tuple[Tuple[int, int, int], ...]:
         """Retorna uma lista de ações que podem ser executadas a
@@ -294,22 +1341,13 @@ class Takuzu(Problem):
         if state.board_filled():
             return tuple()
 
-        necessary_action: Optional[Tuple[int, int, int]] = None
-        possible_actions: Optional[Tuple[Tuple[int, int, int], ...]] = None
+        # Só considerar as ações para a posição escolhida pela política de ordenação
+        square = self.choose_square(state.board)
+        if square is None:
+            return tuple()  # impossível
 
-        for row in range(board.size):
-            for col in range(board.size):
-                # Só considerar as ações para a primeira casa vazia
-                if state.get_square_number(row, col) == 2:
-                    domain = state.get_domain(row, col)
-                    if len(domain) == 0:
-                        return tuple()  # impossible
-                    elif len(domain) == 1 and necessary_action is None:
-                        necessary_action = (row, col, domain[0])
-                    elif possible_actions is None:
-                        possible_actions = tuple((row, col, value) for value in domain)
-
-        return (necessary_action,) if necessary_action else possible_actions or ()
+        (row, col) = square
+        return tuple((row, col, value) for value in state.get_domain(row, col))
 
     def result(self, state: TakuzuState, action: Tuple[int, int, int]) -> TakuzuState:
         """Retorna o estado resultante de executar a 'action' sobre
@@ -320,6 +1358,13 @@ class Takuzu(Problem):
         (row, col, val) = action
         return state.place(row, col, val)
 
+    def apply(self, state: TakuzuState, action: Tuple[int, int, int]) -> None:
+        """Executa a 'action' sobre o próprio 'state', sem criar um novo
+        estado. Usado pelas procuras que desfazem as alterações ao retroceder."""
+
+        (row, col, val) = action
+        state.board.assign(row, col, val)  # se for impossível, deixa de haver ações
+
     def goal_test(self, state: TakuzuState) -> bool:
         """Retorna True se e só se o estado passado como argumento é
         um estado objetivo. Deve verificar se todas as posições do tabuleiro
@@ -366,6 +1411,455 @@ class Takuzu(Problem):
         return board.free_squares * heuristic
 
 
+class TakuzuRows(Problem):
+    """Formulação alternativa do problema, em que cada ação completa uma
+    linha inteira do tabuleiro com uma das linhas válidas (ver
+    Board.get_valid_lines) compatíveis com as colunas. A profundidade da
+    árvore de procura passa a ser, no máximo, o número de linhas."""
+
+    def __init__(self, board: Board, ordering: str = "row-major"):
+        """O construtor especifica o estado inicial e a política de escolha
+        da próxima linha a preencher: a primeira linha por preencher
+        (row-major) ou a linha com menos completações possíveis (mrv e
+        mrv-degree)."""
+
+        if board.row_lines is None:
+            raise ValueError(f"A formulação por linhas só suporta tabuleiros até {Board.LINE_TABLE_MAX_SIZE} de lado")
+        if ordering not in ORDERINGS:
+            raise ValueError(f"Política de ordenação desconhecida: {ordering}")
+
+        initial_state = TakuzuState(board)
+        super().__init__(initial_state)
+        self.ordering = ordering
+
+    def actions(self, state: TakuzuState) -> Tuple[Tuple[int, int], ...]:
+        """Retorna as ações (linha, linha válida) que completam a linha
+        escolhida pela política de ordenação."""
+
+        board = state.board
+        best: Optional[Tuple[int, Tuple[int, ...]]] = None
+        for row in range(board.size):
+            (empty, single, double) = board.free_by_domain_size(row)
+            if empty:
+                return tuple()  # impossível
+            if not (single | double) or (best is not None and self.ordering == "row-major"):
+                continue
+            lines = board.line_completions(row)
+            if best is None or len(lines) < len(best[1]):
+                best = (row, lines)
+
+        if best is None:
+            return tuple()
+
+        (row, lines) = best
+        return tuple((row, line) for line in lines)
+
+    def result(self, state: TakuzuState, action: Tuple[int, int]) -> TakuzuState:
+        """Retorna o estado resultante de completar a linha indicada na ação."""
+
+        board = state.board.copy()
+        board.assign_row(*action)  # se for impossível, deixa de haver ações
+        return TakuzuState(board, state.ids, state.depth + 1)
+
+    def apply(self, state: TakuzuState, action: Tuple[int, int]) -> None:
+        """Completa a linha indicada na ação no próprio 'state' (ver Takuzu.apply)."""
+
+        state.board.assign_row(*action)
+
+    def goal_test(self, state: TakuzuState) -> bool:
+        """Retorna True se e só se o tabuleiro estiver completo."""
+
+        return state.board_filled()
+
+    def h(self, node: Node):
+        """Função heuristica utilizada para a procura A*: número de linhas por
+        preencher."""
+
+        board = node.state.board
+        return sum(1 for row in range(board.size) if board.row_filled[row] != board.full_mask)
+
+
+FORMULATIONS = {
+    "cells": Takuzu,
+    "rows": TakuzuRows,
+}
+
+
+def make_problem(board: Board, formulation: str = "cells", ordering: str = "row-major") -> Problem:
+    """Cria o problema para o tabuleiro com a formulação indicada. Os
+    tabuleiros maiores do que Board.LINE_TABLE_MAX_SIZE, que não têm tabela de
+    linhas válidas, usam sempre a formulação por posições."""
+
+    if formulation == "rows" and board.row_lines is None:
+        formulation = "cells"
+    return FORMULATIONS[formulation](board, ordering)
+
+
+def depth_first_trail_search(problem: Takuzu) -> Optional[Node]:
+    """Procura em profundidade sobre um único tabuleiro, alterado no próprio
+    lugar. Cada alteração é registada num rasto, que é desfeito ao retroceder,
+    pelo que não é criada nenhuma cópia do tabuleiro por nó expandido.
+    Explora as ações pela mesma ordem que depth_first_tree_search."""
+
+    state = TakuzuState(problem.initial.board.copy(), problem.initial.ids)
+    board = state.board
+    board.trail = []
+
+    if problem.goal_test(state):
+        board.trail = None
+        return Node(state)
+
+    frontier = [(board.checkpoint(), reversed(problem.actions(state)))]  # Stack
+
+    while frontier:
+        (checkpoint, actions) = frontier[-1]
+        board.undo(checkpoint)
+        action = next(actions, None)
+        if action is None:
+            frontier.pop()
+            continue
+        problem.apply(state, action)
+        state.depth = len(frontier)
+        if problem.goal_test(state):
+            board.trail = None
+            return Node(state)
+        frontier.append((board.checkpoint(), reversed(problem.actions(state))))
+
+    board.trail = None
+    return None
+
+
+def board_to_cnf(board: Board) -> Tuple[int, List[List[int]]]:
+    """Codifica o tabuleiro em CNF (ver sat.py). A variável row * size + col + 1
+    é verdadeira se a posição (row, col) tiver um 1. As cláusulas exprimem os
+    valores já colocados e os domínios das posições livres, a regra da
+    adjacência (não há três valores iguais seguidos), a do equilíbrio (cada
+    linha e coluna tem no máximo metade, arredondada para cima, de cada valor)
+    e a da unicidade (as linhas são todas diferentes, e as colunas também).
+    Devolve o número de variáveis e as cláusulas."""
+
+    size = board.size
+    max_count = size // 2 + size % 2
+    rows = [[row * size + col + 1 for col in range(size)] for row in range(size)]
+    cols = [[row * size + col + 1 for row in range(size)] for col in range(size)]
+    next_var = size * size + 1
+    clauses: List[List[int]] = []
+
+    for row in range(size):
+        for col in range(size):
+            number = board.get_number(row, col)
+            domain = board.get_domain(row, col) if number == 2 else (number,)
+            var = rows[row][col]
+            if not domain:
+                clauses.append([])  # impossível
+            elif len(domain) == 1:
+                clauses.append([var] if domain[0] else [-var])
+
+    for lines in (rows, cols):
+        for line in lines:
+            for i in range(size - 2):
+                clauses.append([line[i], line[i + 1], line[i + 2]])
+                clauses.append([-line[i], -line[i + 1], -line[i + 2]])
+
+            for lits in (line, [-var for var in line]):
+                (balance, next_var) = sequential_at_most(lits, max_count, next_var)
+                clauses += balance
+
+        # Duas linhas são diferentes se alguma posição (marcada por uma variável auxiliar) tiver valores diferentes
+        for (i, first) in enumerate(lines):
+            for second in lines[i + 1 :]:
+                differs = list(range(next_var, next_var + size))
+                next_var += size
+                clauses.append(differs)
+                for (d, a, b) in zip(differs, first, second):
+                    clauses.append([-d, a, b])
+                    clauses.append([-d, -a, -b])
+
+    return (next_var - 1, clauses)
+
+
+def board_from_model(board: Board, model: List[int]) -> Board:
+    """Devolve o tabuleiro completado com os valores de um modelo de board_to_cnf(board)."""
+
+    solution = board.copy()
+    for row in range(board.size):
+        for col in range(board.size):
+            if solution.get_number(row, col) == 2:
+                solution.set_number(row, col, 1 if model[row * board.size + col] > 0 else 0)
+    return solution
+
+
+def sat_search(problem: Problem, external: bool = False) -> Optional[Node]:
+    """Resolve o tabuleiro do estado inicial do problema com o resolvedor
+    CDCL de sat.py, em vez de procurar na árvore do problema. A aprendizagem
+    de cláusulas evita que a mesma contradição seja explorada várias vezes.
+    Se external for True e estiver instalado um resolvedor SAT externo (ver
+    sat.EXTERNAL_SOLVERS), a codificação é-lhe entregue num ficheiro DIMACS,
+    o que permite resolver tabuleiros muito maiores; caso contrário, usa o
+    resolvedor interno. Respeita o prazo de um DeadlineProblem."""
+
+    board = problem.initial.board
+    (num_vars, clauses) = board_to_cnf(board)
+    deadline = getattr(problem, "deadline", None)
+    solver = find_external_solver() if external else None
+    if solver is not None:
+        model = external_satisfiable(num_vars, clauses, solver, deadline)
+    else:
+        model = cdcl_satisfiable(num_vars, clauses, deadline)
+    return Node(TakuzuState(board_from_model(board, model))) if model is not None else None
+
+
+# Só interessa o tabuleiro final, pelo que as procuras em árvore não guardam o
+# caminho: cada nó deixa de ser usado assim que sai da fronteira
+SEARCHES = {
+    "bfs": lambda problem: breadth_first_tree_search(problem, keep_path=False),
+    "dfs": lambda problem: depth_first_tree_search(problem, keep_path=False),
+    "greedy": greedy_search,
+    "ids": iterative_deepening_search,
+    "a_star": astar_search,
+    "trail": depth_first_trail_search,
+    "sat": sat_search,
+    "sat-external": lambda problem: sat_search(problem, external=True),
+}
+
+
+def solve(
+    board: Board,
+    search: Union[str, Callable[[Problem], Optional[Node]]] = "dfs",
+    ordering: str = "row-major",
+    timeout: Optional[float] = None,
+    formulation: str = "cells",
+) -> Optional[TakuzuState]:
+    """Resolve o tabuleiro com a técnica de procura (o nome de uma das
+    SEARCHES ou uma função de procura de search.py), a política de ordenação
+    e a formulação do problema (ver FORMULATIONS) indicadas. Devolve o estado
+    objetivo, ou None se não houver solução. Se for indicado um timeout (em
+    segundos), lança TimeoutError quando a procura demorar mais do que isso.
+
+    Não altera o tabuleiro nem nenhum estado global, pelo que pode ser
+    chamada para vários tabuleiros, de tamanhos diferentes, em simultâneo em
+    várias threads do mesmo processo."""
+
+    problem = make_problem(board, formulation, ordering)
+    if timeout is not None:
+        problem = DeadlineProblem(problem, time.monotonic() + timeout)
+    goal_node = (SEARCHES[search] if isinstance(search, str) else search)(problem)
+    return goal_node.state if goal_node else None
+
+
+def profile_solve(
+    board: Board,
+    search: Union[str, Callable[[Problem], Optional[Node]]] = "dfs",
+    ordering: str = "row-major",
+    timeout: Optional[float] = None,
+    formulation: str = "cells",
+) -> Tuple[Optional[TakuzuState], Dict[str, object]]:
+    """Resolve o tabuleiro como solve, medindo a procura com ProfiledProblem
+    e, com a representação por máscaras de bits, o tempo gasto em cada regra
+    de recalculate_domains_after_placing. Devolve o estado objetivo (ou None)
+    e o perfil da resolução, serializável em JSON, com o estado (solved,
+    no_solution ou timed_out), o tempo total, o tempo por fase da procura e
+    por regra, os nós por segundo, o pico da fronteira (exceto nas procuras
+    que alteram o tabuleiro no próprio lugar, ver ProfiledProblem), a
+    profundidade máxima e o número de retrocessos."""
+
+    board = board.copy()
+    if isinstance(board, Board):
+        board.rule_times = {}
+    problem = ProfiledProblem(make_problem(board, formulation, ordering))
+    searcher = SEARCHES[search] if isinstance(search, str) else search
+
+    start = time.perf_counter()
+    try:
+        if timeout is not None:
+            goal_node = searcher(DeadlineProblem(problem, time.monotonic() + timeout))
+        else:
+            goal_node = searcher(problem)
+    except TimeoutError:
+        (goal_node, status) = (None, "timed_out")
+    else:
+        status = "solved" if goal_node else "no_solution"
+    elapsed = time.perf_counter() - start
+
+    profile: Dict[str, object] = {
+        "search": search if isinstance(search, str) else search.__name__,
+        "ordering": ordering,
+        "formulation": next(name for (name, cls) in FORMULATIONS.items() if type(problem.problem) is cls),
+        "size": board.size,
+        "status": status,
+        "time": elapsed,
+        **problem.profile(elapsed),
+        "rules": dict(board.rule_times) if isinstance(board, Board) else {},
+    }
+    return (goal_node.state if goal_node else None, profile)
+
+
+def format_solution(state: Optional[TakuzuState]) -> str:
+    """Devolve a solução no formato de saída indicado."""
+
+    return str(state) if state else "No solution found"
+
+
+# Parâmetros de solve_to_str e profile_to_str: valores do tabuleiro (ver Board.read_grid), nome da
+# representação (ver BACKENDS) e os restantes parâmetros de solve
+SolveTask = Tuple[List[List[int]], str, str, str, Optional[float], str]
+
+
+def solve_to_str(task: SolveTask) -> str:
+    """Constrói o tabuleiro com a representação indicada e resolve-o com os
+    parâmetros de solve indicados, devolvendo a solução já formatada. Usado
+    pelos processos de solve_many, para que a leitura e a propagação inicial
+    de cada tabuleiro também sejam feitas nos processos."""
+
+    (grid, backend, *params) = task
+    try:
+        return format_solution(solve(BACKENDS[backend].from_grid(grid), *params))
+    except TimeoutError:
+        return "Timed out"
+
+
+def profile_to_str(task: SolveTask) -> Tuple[str, Dict[str, object]]:
+    """Como solve_to_str, mas com profile_solve, devolvendo a solução já
+    formatada e o perfil da resolução. A construção e a propagação inicial do
+    tabuleiro são medidas à parte, na fase setup do perfil, com o tempo total
+    e, com a representação por máscaras de bits, o tempo gasto em cada regra."""
+
+    (grid, backend, *params) = task
+    rule_times: Dict[str, float] = {}
+    start = time.perf_counter()
+    board = Board.from_grid(grid, rule_times) if BACKENDS[backend] is Board else BACKENDS[backend].from_grid(grid)
+    setup = time.perf_counter() - start
+    (state, profile) = profile_solve(board, *params)
+    profile["setup"] = {"time": setup, "rules": rule_times}
+    return (format_solution(state) if profile["status"] != "timed_out" else "Timed out", profile)
+
+
+def solve_chunk(worker: Callable[[SolveTask], object], tasks: List[SolveTask]) -> List[object]:
+    """Aplica worker a cada um dos tabuleiros de um grupo. Usado pelos processos de solve_many."""
+
+    return [worker(task) for task in tasks]
+
+
+def solve_many(
+    grids: Iterable[List[List[int]]],
+    search: str = "dfs",
+    ordering: str = "row-major",
+    jobs: int = 1,
+    chunksize: int = 1,
+    timeout: Optional[float] = None,
+    formulation: str = "cells",
+    profile: bool = False,
+    backend: str = "bitmask",
+) -> Iterator[Union[str, Tuple[str, Dict[str, object]]]]:
+    """Resolve os tabuleiros com os valores indicados (ver Board.read_grids),
+    com a representação backend, e devolve as soluções formatadas, pela mesma
+    ordem dos tabuleiros. Com jobs > 1 (ou 0, para usar todos os
+    processadores), os tabuleiros são distribuídos por um conjunto de
+    processos em grupos de chunksize tabuleiros, e cada processo constrói e
+    propaga os tabuleiros que recebe; só são lidos os grupos necessários para
+    manter os processos ocupados. Com jobs == 1, cada tabuleiro é lido e
+    resolvido só quando for pedida a sua solução. O timeout aplica-se a cada
+    tabuleiro. Se profile for True, cada solução vem acompanhada do perfil da
+    sua resolução (ver profile_solve)."""
+
+    tasks = ((grid, backend, search, ordering, timeout, formulation) for grid in grids)
+    worker = profile_to_str if profile else solve_to_str
+    if jobs == 1:
+        yield from map(worker, tasks)
+        return
+
+    jobs = jobs or os.cpu_count() or 1
+    with ProcessPoolExecutor(jobs) as executor:
+        running: Deque[Future] = deque()
+        for chunk in iter(lambda: list(islice(tasks, chunksize)), []):
+            running.append(executor.submit(solve_chunk, worker, chunk))
+            if len(running) >= 2 * jobs:
+                yield from running.popleft().result()
+        while running:
+            yield from running.popleft().result()
+
+
+# Sinal partilhado pelos processos de parallel_depth_first_search para pararem
+# assim que um deles encontre a solução
+subtree_stop: Optional[EventType] = None
+
+
+def init_subtree_worker(stop: EventType) -> None:
+    """Inicializa um processo de parallel_depth_first_search."""
+
+    global subtree_stop
+    subtree_stop = stop
+
+
+def search_subtree(task: Tuple[Board, Type[Problem], str, int]) -> Tuple[Optional[Board], List[Board]]:
+    """Procura em profundidade a partir do tabuleiro indicado, expandindo no
+    máximo budget nós. Devolve o tabuleiro resolvido, se o encontrar, e os
+    tabuleiros que ficaram por explorar se o orçamento se esgotar (pela ordem
+    em que seriam explorados), para serem redistribuídos pelos processos."""
+
+    (board, formulation, ordering, budget) = task
+    problem = formulation(board, ordering)
+    frontier = [Node(problem.initial)]  # Stack
+
+    while frontier:
+        if subtree_stop is not None and subtree_stop.is_set():
+            return (None, [])
+        node = frontier.pop()
+        if problem.goal_test(node.state):
+            return (node.state.board, [])
+        if budget == 0:
+            frontier.append(node)
+            return (None, [node.state.board for node in reversed(frontier)])
+        frontier.extend(node.expand(problem))
+        budget -= 1
+
+    return (None, [])
+
+
+def parallel_depth_first_search(problem: Union[Takuzu, TakuzuRows], jobs: int = 0, budget: int = 1000) -> Optional[Node]:
+    """Procura em profundidade paralela para um único tabuleiro.
+
+    A árvore de procura é expandida em largura até haver subárvores
+    suficientes para ocupar os jobs processos (0 para um por processador),
+    que são então exploradas em profundidade por um conjunto de processos.
+    Cada processo expande no máximo budget nós de cada vez; se a sua
+    subárvore não estiver esgotada, os nós que ficaram por explorar voltam a
+    ser distribuídos, para que as subárvores maiores sejam partilhadas pelos
+    processos que ficaram livres. Assim que um processo encontra a solução,
+    os restantes são cancelados."""
+
+    jobs = jobs or os.cpu_count() or 1
+    formulation = type(problem)
+    frontier = deque([Node(problem.initial)])  # FIFO queue
+    while frontier and len(frontier) < 4 * jobs:
+        node = frontier.popleft()
+        if problem.goal_test(node.state):
+            return node
+        frontier.extend(node.expand(problem))
+
+    stop = Event()
+    with ProcessPoolExecutor(jobs, initializer=init_subtree_worker, initargs=(stop,)) as executor:
+        # As subárvores mais à direita são as primeiras a ser exploradas por depth_first_tree_search
+        running = {
+            executor.submit(search_subtree, (node.state.board, formulation, problem.ordering, budget))
+            for node in reversed(frontier)
+        }
+        while running:
+            (done, running) = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                (solution, unexplored) = future.result()
+                if solution is not None:
+                    stop.set()
+                    for other in running:
+                        other.cancel()
+                    return Node(TakuzuState(solution))
+                running |= {
+                    executor.submit(search_subtree, (board, formulation, problem.ordering, budget)) for board in unexplored
+                }
+
+    return None
+
+
 if __name__ == "__main__":
     # Ler o ficheiro do standard input,
     # Usar uma técnica de procura para resolver a instância,
@@ -375,14 +1869,159 @@ if __name__ == "__main__":
     # Ler tabuleiro do ficheiro 'i1.txt'(Figura 1):
     # $ python3 takuzu < i1.txt
 
-    board = Board.parse_instance_from_stdin()
-    # Criar uma instância de Takuzu:
-    problem = Takuzu(board)
-
-    # Obter o nó solução usando a procura em profundidade:
-    goal_node = depth_first_tree_search(problem)
-    # Verificar se foi atingida a solução
-    if goal_node:
-        print(goal_node.state)
+    parser = ArgumentParser(description="Resolve tabuleiros de Takuzu lidos do standard input.")
+    parser.add_argument(
+        "--search",
+        choices=SEARCHES,
+        default="dfs",
+        help="técnica de procura a usar (por omissão, procura em profundidade)",
+    )
+    parser.add_argument(
+        "--ordering",
+        choices=ORDERINGS,
+        default="row-major",
+        help="política de escolha da próxima posição a preencher (por omissão, a primeira posição livre)",
+    )
+    parser.add_argument(
+        "--formulation",
+        choices=FORMULATIONS,
+        default="cells",
+        help="formulação do problema: cada ação preenche uma posição (cells, por omissão) ou uma linha inteira "
+        "(rows, só até 24x24; os tabuleiros maiores usam cells)",
+    )
+    parser.add_argument(
+        "--backend",
+        choices=BACKENDS,
+        default="bitmask",
+        help="representação do tabuleiro: máscaras de bits (bitmask, por omissão) ou arrays NumPy com as regras "
+        "aplicadas a todo o tabuleiro de uma só vez (numpy)",
+    )
+    parser.add_argument(
+        "--batch",
+        action="store_true",
+        help="resolve vários tabuleiros seguidos, lidos dos ficheiros ou diretorias indicados (ou do standard "
+        "input), escrevendo as soluções pela mesma ordem, separadas por uma linha vazia",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="lê tabuleiros do standard input continuamente, escrevendo a solução de cada um, seguida de uma linha "
+        "vazia, assim que é encontrada, para que o programa possa ser usado como coprocesso",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="número de processos a usar (0 para um por processador; por omissão, 1). Com --batch, os tabuleiros "
+        "são distribuídos pelos processos; sem --batch, o tabuleiro é resolvido com uma procura em profundidade "
+        "paralela",
+    )
+    parser.add_argument(
+        "--chunksize",
+        type=int,
+        default=1,
+        help="número de tabuleiros enviados de cada vez a cada processo (por omissão, 1)",
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        help="tempo máximo, em segundos, para resolver cada tabuleiro",
+    )
+    parser.add_argument(
+        "--dimacs",
+        metavar="FICHEIRO",
+        help="em vez de resolver o tabuleiro, escreve a sua codificação CNF no ficheiro indicado, em formato DIMACS",
+    )
+    parser.add_argument(
+        "--model",
+        metavar="FICHEIRO",
+        help="em vez de resolver o tabuleiro, lê do ficheiro indicado a resposta de um resolvedor SAT à codificação "
+        "escrita com --dimacs e escreve a solução correspondente",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="escreve no standard error, por cada tabuleiro, uma linha JSON com o perfil da resolução: tempo da "
+        "propagação inicial, por fase da procura e por regra de propagação, nós por segundo, pico da fronteira, "
+        "profundidade máxima e número de retrocessos",
+    )
+    parser.add_argument("paths", nargs="*", help="ficheiros ou diretorias com tabuleiros (só com --batch)")
+    args = parser.parse_args()
+    if args.jobs < 0:
+        parser.error("o número de processos (--jobs) não pode ser negativo")
+    if args.chunksize < 1:
+        parser.error("o número de tabuleiros enviados de cada vez (--chunksize) tem de ser pelo menos 1")
+    if args.paths and not args.batch:
+        parser.error("só é possível indicar ficheiros com --batch")
+    if (args.batch or args.timeout is not None) and (args.dimacs or args.model):
+        parser.error("não é possível usar --dimacs nem --model com --batch nem --timeout")
+    if args.stream and (args.batch or args.dimacs or args.model or args.jobs != 1):
+        parser.error("não é possível usar --stream com --batch, --dimacs, --model nem --jobs")
+    if args.jobs != 1 and not args.batch and (args.search != "dfs" or args.timeout is not None):
+        parser.error("não é possível usar --search (exceto dfs) nem --timeout com --jobs sem --batch")
+    if args.profile and (args.dimacs or args.model or (args.jobs != 1 and not args.batch)):
+        parser.error("não é possível usar --profile com --dimacs, --model nem com --jobs sem --batch")
+
+    if args.stream:
+        # Cada tabuleiro só é lido depois de escrita a solução do anterior
+        solutions = solve_many(
+            Board.read_grids([]),
+            args.search,
+            args.ordering,
+            timeout=args.timeout,
+            formulation=args.formulation,
+            profile=args.profile,
+            backend=args.backend,
+        )
+        for solution in solutions:
+            if args.profile:
+                (solution, profile) = solution
+                print(json.dumps(profile), file=stderr, flush=True)
+            print(solution, end="\n\n", flush=True)
+    elif args.batch:
+        solutions = solve_many(
+            Board.read_grids(args.paths),
+            args.search,
+            args.ordering,
+            args.jobs,
+            args.chunksize,
+            args.timeout,
+            args.formulation,
+            args.profile,
+            args.backend,
+        )
+        for (i, solution) in enumerate(solutions):
+            if args.profile:
+                (solution, profile) = solution
+                print(json.dumps(profile), file=stderr)
+            if i > 0:
+                print()
+            print(solution)
+    elif args.dimacs:
+        board = BACKENDS[args.backend].parse_instance(stdin)
+        with open(args.dimacs, "w") as stream:
+            write_dimacs(stream, *board_to_cnf(board))
+    elif args.model:
+        board = BACKENDS[args.backend].parse_instance(stdin)
+        (num_vars, _) = board_to_cnf(board)
+        with open(args.model) as stream:
+            model = read_dimacs_model(stream, num_vars)
+        print(format_solution(TakuzuState(board_from_model(board, model)) if model is not None else None))
+    elif args.profile:
+        task = (Board.read_grid(stdin), args.backend, args.search, args.ordering, args.timeout, args.formulation)
+        (solution, profile) = profile_to_str(task)
+        print(json.dumps(profile), file=stderr)
+        print(solution)
+    elif args.jobs != 1:
+        board = BACKENDS[args.backend].parse_instance(stdin)
+        # Criar uma instância de Takuzu:
+        problem = make_problem(board, args.formulation, args.ordering)
+
+        # Obter o nó solução usando a procura em profundidade paralela:
+        goal_node = parallel_depth_first_search(problem, args.jobs)
+        # Verificar se foi atingida a solução
+        print(format_solution(goal_node.state if goal_node else None))
     else:
-        print("No solution found")
+        # Resolver o tabuleiro com a técnica de procura escolhida (e o timeout, se indicado)
+        task = (Board.read_grid(stdin), args.backend, args.search, args.ordering, args.timeout, args.formulation)
+        print(solve_to_str(task))
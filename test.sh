@@ -4,7 +4,9 @@ files=$(ls tests/ | grep "^input_")
 
 for file in $files
 do
-  python takuzu.py < tests/$file > /tmp/takuzu.out
+  args_file=tests/$(echo $file | sed 's/input/args/')
+  args=$([ -f $args_file ] && cat $args_file)
+  python takuzu.py $args < tests/$file > /tmp/takuzu.out
   output=$(cat /tmp/takuzu.out)
   output_file=$(echo $file | sed 's/input/output/')
   expected_output=$(cat tests/$output_file)